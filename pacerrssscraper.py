@@ -24,6 +24,8 @@
  There should be test cases in ./tests. This module should also pass
  pylint with 10.00/10 with the provided disable pragmas.
 
+ Benchmarks are in ./run-benchmarks, over the corpus in ./benchmarks.
+
 
  License
  ----------
@@ -49,38 +51,121 @@
  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
  THE SOFTWARE.
 """
-import feedparser
-from time import gmtime, sleep
+from time import gmtime, sleep, monotonic
 from datetime import datetime, timedelta, tzinfo
 from calendar import timegm # inverse of gmtime
 import sys
 import traceback
+import random
 import os
 import signal
-import smtplib
-from email.mime.text import MIMEText
+from email.utils import parsedate_tz, mktime_tz
 import re
-from pprint import pformat
 import argparse
 import socket
-from urllib.error import URLError
-from xml.sax import SAXException
-from collections import OrderedDict, defaultdict
+from urllib.error import URLError, HTTPError
+from xml.sax import SAXException, make_parser
+from xml.sax.handler import ContentHandler
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import threading
+import queue
+import heapq
+import socketserver
+from bisect import bisect_left
+from itertools import islice
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlsplit, urljoin, parse_qs
+import http.client
+from contextlib import contextmanager
 import logging, logging.handlers
 from html import unescape
-# https://github.com/sixohsix/twitter/tree/master
-from twitter import Twitter, OAuth, TwitterHTTPError
 import json
 import sqlite3
-from bs4 import BeautifulSoup
+import hashlib
+import gzip
+from io import BytesIO
+# Imported where they are used, since most runs never need them,
+# and importing them is a good part of our startup time:
+# smtplib and email.mime (EmailNotifier), twitter (TwitterPublisher,
+# https://github.com/sixohsix/twitter/tree/master), pprint (RSSEntry
+# reprs), urllib.request (fetch_feed without a ConnectionPool),
+# and tarfile and concurrent.futures.process (backfill).
 
 # pylint: disable=C0103,R0902,W0142,W0232,W0621,W0703
 
 VERSION = "generic-0.4"
 
-# PACER servers frequently have problems.
-# Ensure that connections don't hang.
-socket.setdefaulttimeout(10)
+# Handlers are set up in main.
+log = logging.getLogger("pacerrssscraper-"+VERSION)
+
+# PACER servers frequently have problems, so nothing waits on the
+# network without a timeout. Feeds fetched over a ConnectionPool have
+# their own; everything else (feeds fetched with urlopen(), mail,
+# Twitter, and clients of our own servers) gets this many seconds.
+TIMEOUT = 10
+
+# Where each court publishes its feed.
+FEED_URL = "https://ecf.{}.uscourts.gov/cgi-bin/rss_outside.pl"
+
+USER_AGENT = "pacerrssscraper/" + VERSION
+
+# Where RECAP keeps its documents (see RSSEntry.recap_links).
+RECAP_URL = "https://archive.org"
+
+# Courts which have RSS feeds.
+RSS_COURTS = ["almd", "alsd", "akd", "ared", "arwd", "cacd",
+              "cand", "casd", "ctd", "ded", "dcd", "flmd",
+              "flsd", "gamd", "gud", "idd", "ilcd", "ilnd",
+              "innd", "insd", "iand", "iasd", "ksd", "kywd", "laed",
+              "lamd", "lawd", "mad", "mied", "miwd", "moed",
+              "mowd", "mtd", "ned", "nhd", "njd", "nyed",
+              "nynd", "nysd", "nced", "ncmd", "ncwd", "nmid",
+              "ohnd", "ohsd", "okwd", "ord", "paed", "pamd", "pawd",
+              "prd", "rid", "sdd", "tned", "tnmd", "txed",
+              "txsd", "txwd", "utd", "vtd", "vid", "vawd",
+              "waed", "wawd", "wied", "wiwd", "wvnd", "wvsd", "wyd"]
+
+
+# Matches an HTML tag (or comment), for stripping them out of text;
+# a "<" not followed by a name, "/" or "!" is just text
+p_tag = re.compile(r'<[a-zA-Z/!][^>]*>')
+
+def strip_tags(text):
+    """Remove HTML tags from `text`, keeping the text between them.
+
+    Entities that only became visible once the tags were gone
+    are decoded as well.
+    """
+    if "<" not in text:
+        return text
+    return unescape(p_tag.sub("", text))
+
+
+class LazyField:
+    """A field of RSSEntry which is only worked out from the raw RSS entry
+    the first time it is used, since filters usually reject an entry
+    after looking at one or two fields.
+
+    It can also be assigned to, just like a plain attribute.
+    """
+    def __init__(self, slot, parse):
+        self.slot = slot
+        self.parse = parse
+        self.__doc__ = parse.__doc__
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        try:
+            return getattr(obj, self.slot)
+        except AttributeError:
+            value = self.parse(obj)
+            setattr(obj, self.slot, value)
+            return value
+
+    def __set__(self, obj, value):
+        setattr(obj, self.slot, value)
 
 
 class RSSEntry:
@@ -108,6 +193,9 @@ class RSSEntry:
     - docket_link:   The url of the PACER docket for this case.
     - link*:         A link at which the document itself may be viewed.
     - number*:       The number of the document within the docket.
+    - recap:         The RECAP links (see recap_links) which RecapResolver
+                     found to exist, each None if it isn't (yet);
+                     None if they haven't been checked.
 
     * Some entries are not numbered. In this case link will equal
       docket_link and number will be 0. This will break LREF
@@ -115,6 +203,9 @@ class RSSEntry:
 
     Other attributes on-the-fly as defined below.
 
+    Only court and pacer_num are extracted up front; everything else is
+    extracted when first used (see LazyField).
+
     Re: LREF, see http://www.plainsite.org/articles/article.html?id=7
     """
     # Pre-compiled regular expressions used in every invocation of __init__()
@@ -124,27 +215,17 @@ class RSSEntry:
     p_court = re.compile(r'ecf\.([a-z]+)\.')
     p_pacer_num = re.compile(r'DktRpt.pl\?([0-9]+)')
 
+    __slots__ = ('entry', 'court', 'pacer_num', 'matched',
+                 '_doc_link', '_number', '_title', '_docket_link',
+                 '_case_name', '_case', '_time_filed', '_recap')
 
     def __init__(self, entry):
         """Construct an RSSEntry object out of the actual RSS entry."""
 
         # code adapted from the old parse_entry()
 
-        # get the link itself (to the actual document)
-        # (this also strips the query strings)
-        match = self.p_link.search(entry['summary'])
-        self._link = unescape(match.group(1)) if match else ""
-
-        # extract the document number
-        match = self.p_number.search(entry['summary'])
-        self.number = int(match.group(1)) if match else 0
-
-        # title
-        match = self.p_title.search(entry['summary'])
-        self.title = unescape(match.group(1)) if match else "?"
-        # PACER likes to put HTML in the title. Take it out.
-        if "<" in self.title:
-            self.title = ''.join(BeautifulSoup(self.title).findAll(text=True))
+        # the raw entry, from which the other fields are extracted
+        self.entry = entry
 
         # court
         match = self.p_court.search(entry['link'])
@@ -155,20 +236,59 @@ class RSSEntry:
         self.pacer_num = match.group(1) if match else 0
         # 0 is potentially a valid PACER number though, so beware
 
-        self.docket_link = unescape(entry['id'].split("&")[0])
+        # keywords it was reported for (see keyword_filter)
+        self.matched = ()
 
-        self.case_name = unescape(" ".join(entry['title'].split(" ")[1:]))
-        if "<" in self.case_name:
-            self.case_name = ''.join(BeautifulSoup(self.case_name).findAll(text=True))
+    def _parse_doc_link(self):
+        """The link to the document itself, without query strings."""
+        match = self.p_link.search(self.entry['summary'])
+        return unescape(match.group(1)) if match else ""
+
+    def _parse_number(self):
+        """The number of the document within the docket."""
+        match = self.p_number.search(self.entry['summary'])
+        return int(match.group(1)) if match else 0
+
+    def _parse_title(self):
+        """The title of the document, as given by the RSS feed."""
+        match = self.p_title.search(self.entry['summary'])
+        # PACER likes to put HTML in the title. Take it out.
+        return strip_tags(unescape(match.group(1))) if match else "?"
 
-        self.case = entry['title'].split(" ")[0].replace(":", "-")
+    def _parse_docket_link(self):
+        """The url of the PACER docket for this case."""
+        return unescape(self.entry['id'].split("&")[0])
+
+    def _parse_case_name(self):
+        """The case name, in human-readable form."""
+        return strip_tags(
+            unescape(" ".join(self.entry['title'].split(" ")[1:])))
+
+    def _parse_case(self):
+        """The case caption, e.g. 3:14-cv-123456."""
+        case = self.entry['title'].split(" ")[0].replace(":", "-")
 
         # strip off judge initials and criminal case sub-numbers
-        self.case = self.case.split("-")[:4]
+        case = case.split("-")[:4]
         # restore colon
-        self.case = self.case[0] + ":" + "-".join(self.case[1:])
+        return case[0] + ":" + "-".join(case[1:])
+
+    def _parse_time_filed(self):
+        """When the document was filed, as an offset-aware datetime."""
+        return st2dt(self.entry['published_parsed'])
 
-        self.time_filed = st2dt(entry['published_parsed'])
+    def _parse_recap(self):
+        """Not checked yet; see RecapResolver."""
+        return None
+
+    _link = LazyField('_doc_link', _parse_doc_link)
+    number = LazyField('_number', _parse_number)
+    title = LazyField('_title', _parse_title)
+    docket_link = LazyField('_docket_link', _parse_docket_link)
+    case_name = LazyField('_case_name', _parse_case_name)
+    case = LazyField('_case', _parse_case)
+    time_filed = LazyField('_time_filed', _parse_time_filed)
+    recap = LazyField('_recap', _parse_recap)
 
     @property
     def recap_links(self):
@@ -182,13 +302,13 @@ class RSSEntry:
         is the URL of the case and the second, the URL
         of the document.
 
-        Out of necessity, neither is verified.
+        Out of necessity, neither is verified (but see RecapResolver).
         """
         recap_case = "gov.uscourts.{}.{}".format(self.court, self.pacer_num)
         recap_doc = recap_case + ".{}.0.pdf".format(self.number)
 
-        return ("https://archive.org/details/"+recap_case,
-                "https://archive.org/download/"+recap_case+"/"+recap_doc)
+        return (RECAP_URL+"/details/"+recap_case,
+                RECAP_URL+"/download/"+recap_case+"/"+recap_doc)
 
     @property
     def lref(self):
@@ -203,7 +323,42 @@ class RSSEntry:
         """Override link attribute."""
         return self._link if self.number > 0 else self.docket_link
 
+    def to_dict(self):
+        """A JSON-serializable dict from which from_dict() rebuilds
+        this entry, including any changes made to its title and
+        case name (e.g. by filters)."""
+        entry = dict(self.entry)
+        entry['published_parsed'] = list(entry['published_parsed'])
+        return {'entry': entry,
+                'title': self.title,
+                'case_name': self.case_name,
+                'matched': list(self.matched),
+                'recap': self.recap and list(self.recap)}
+
+    def copy(self):
+        """A copy of this entry, which can be changed (say, given
+        another case name) without changing this one."""
+        other = RSSEntry.__new__(RSSEntry)
+        for slot in self.__slots__:
+            try:
+                setattr(other, slot, getattr(self, slot))
+            except AttributeError:
+                pass # not worked out yet
+        return other
+
+    @classmethod
+    def from_dict(cls, d):
+        """Inverse of to_dict()."""
+        self = cls(d['entry'])
+        self.title = d['title']
+        self.case_name = d['case_name']
+        self.matched = tuple(d.get('matched', ()))
+        if d.get('recap'):
+            self.recap = tuple(d['recap'])
+        return self
+
     def __repr__(self):
+        from pprint import pformat
         return "RSSEntry "+pformat({
             "title": self.title,
             "time_filed": dtfmt(self.time_filed),
@@ -217,7 +372,1150 @@ class RSSEntry:
             "lref": self.lref})
 
 
-def scrape(court, entry_filter, last_checked, notifier):
+def feed_url(court, url=None):
+    """The URL of the RSS feed of `court`.
+
+    `url` is a template like FEED_URL to use instead of it.
+    """
+    return (url or FEED_URL).format(court)
+
+def parse_date(text):
+    """Parse an RSS (RFC 822) date to a UTC struct_time."""
+    parsed = parsedate_tz(text)
+    if parsed is None:
+        raise SAXException("Invalid date {!r}".format(text))
+    return gmtime(mktime_tz(parsed))
+
+
+class Feed:
+    """The parts of an RSS feed that we use.
+
+    - status:   The HTTP status it was fetched with. 304 means it
+                hadn't changed, in which case nothing else is filled in.
+    - updated:  The lastBuildDate of the feed as a UTC struct_time,
+                or None if it didn't have one.
+    - entries:  The entries (items) that were read, newest first,
+                as dicts with the same keys feedparser used to give:
+                'title', 'link', 'id', 'summary' and 'published_parsed'.
+    - complete: Whether the whole feed was read. If not, `entries`
+                ends with the first entry that was not new.
+    - etag, modified: HTTP validators (see feed_validators)
+    - parse_time: Seconds spent parsing it (see FeedReader)
+    """
+    def __init__(self, status=200, updated=None, entries=(),
+                 complete=True, etag=None, modified=None):
+        self.status = status
+        self.updated = updated
+        self.entries = list(entries)
+        self.complete = complete
+        self.etag = etag
+        self.modified = modified
+        self.parse_time = 0.0
+
+    def overflowed(self, last_checked):
+        """Whether entries newer than `last_checked` may have fallen
+        out of the feed before we read it: it was read to the end,
+        and even its oldest entry is newer than that."""
+        return (self.status != 304 and self.complete and
+                len(self.entries) > 0 and
+                st2dt(self.entries[-1]['published_parsed']) > last_checked)
+
+
+class FeedHandler(ContentHandler):
+    """SAX handler picking the channel's lastBuildDate
+    and its items out of an RSS feed."""
+
+    # RSS element --> key in the entry dict
+    fields = {'title': 'title', 'link': 'link', 'guid': 'id',
+              'description': 'summary', 'pubDate': 'published'}
+
+    def __init__(self):
+        super().__init__()
+        self.updated = None
+        # completed items not yet consumed
+        self.items = deque()
+        self._item = None
+        self._text = []
+
+    def startElement(self, name, attrs):
+        if name == 'item':
+            self._item = {}
+        self._text = []
+
+    def characters(self, content):
+        self._text.append(content)
+
+    def endElement(self, name):
+        text = "".join(self._text).strip()
+        self._text = []
+
+        if self._item is None:
+            if name == 'lastBuildDate':
+                self.updated = parse_date(text)
+        elif name == 'item':
+            item, self._item = self._item, None
+            item['published_parsed'] = parse_date(item.pop('published', ""))
+            self.items.append(item)
+        elif name in self.fields:
+            self._item[self.fields[name]] = text
+
+
+class FeedReader:
+    """Incremental reader for an RSS feed in the file-like object `stream`.
+
+    The stream is read and parsed one chunk at a time, only as far as is
+    needed: `updated` reads up to the channel's lastBuildDate, and
+    iterating over the reader yields entries as soon as they are read.
+
+    Invalid XML raises SAXException.
+    """
+    def __init__(self, stream, chunk_size=8192):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.handler = FeedHandler()
+        self.parser = make_parser()
+        self.parser.setContentHandler(self.handler)
+        # whether the whole stream has been read
+        self.done = False
+        # seconds spent parsing, as opposed to reading
+        self.parse_time = 0.0
+
+    def _read(self):
+        """Parse another chunk. Returns False if there are none left."""
+        if self.done:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        start = monotonic()
+        if chunk:
+            self.parser.feed(chunk)
+        else:
+            self.parser.close()
+            self.done = True
+        self.parse_time += monotonic() - start
+        return not self.done
+
+    @property
+    def updated(self):
+        """The lastBuildDate of the feed (see Feed)."""
+        while self.handler.updated is None and self._read():
+            pass
+        return self.handler.updated
+
+    def __iter__(self):
+        while True:
+            while self.handler.items:
+                yield self.handler.items.popleft()
+            if not self._read():
+                return
+
+def parse_feed(stream, last_checked=None):
+    """Read the RSS feed in the file-like object `stream` into a Feed.
+
+    If `last_checked` (an offset-aware datetime) is given, reading stops
+    at the first entry published no later than that, since the entries
+    are newest first and everything after it has been seen already.
+    """
+    reader = FeedReader(stream)
+    updated = reader.updated
+
+    entries = []
+    for entry in reader:
+        entries.append(entry)
+        if (last_checked is not None and
+                st2dt(entry['published_parsed']) <= last_checked):
+            break
+
+    feed = Feed(updated=updated, entries=entries, complete=reader.done)
+    feed.parse_time = reader.parse_time
+    return feed
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections, kept per host and reused from
+    one fetch to the next, so that polling a court doesn't cost a new
+    TCP and TLS handshake every time.
+
+    Connecting times out after `connect_timeout` seconds, and waiting
+    on any one read after `read_timeout`. At most `max_idle` idle
+    connections are kept to each host. `context` is the SSLContext
+    for HTTPS (by default, that of the system). `connections` counts
+    the connections ever opened.
+    """
+    def __init__(self, connect_timeout=5, read_timeout=10, max_idle=8,
+                 context=None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_idle = max_idle
+        self.context = context
+        self.connections = 0
+        # (scheme, host) --> idle connections, last used last
+        self.idle = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def _connect(self, scheme, host):
+        """A new connection to `host`."""
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(
+                host, timeout=self.connect_timeout, context=self.context)
+        else:
+            conn = http.client.HTTPConnection(
+                host, timeout=self.connect_timeout)
+        try:
+            conn.connect()
+        except socket.timeout:
+            raise
+        except OSError as e:
+            raise URLError(e)
+        conn.sock.settimeout(self.read_timeout)
+        with self.lock:
+            self.connections += 1
+        return conn
+
+    @contextmanager
+    def get(self, url, headers=None, method="GET"):
+        """GET (or `method`) `url` with `headers`, over an idle
+        connection if there is one. Use as a context manager, which
+        gives the response.
+
+        If the whole body was read by the end of the block, the
+        connection goes back into the pool; otherwise it is closed.
+        A reused connection which the server has since closed is
+        retried once on a new one.
+
+        Raises socket.timeout on a timeout, and URLError if the
+        request fails otherwise.
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = (parts.path or "/") + ("?" + parts.query if parts.query
+                                      else "")
+        for attempt in range(2):
+            conn = None
+            if attempt == 0:
+                with self.lock:
+                    if self.idle[key]:
+                        conn = self.idle[key].pop()
+            reused = conn is not None
+            if not reused:
+                conn = self._connect(*key)
+            try:
+                conn.request(method, path, headers=headers or {})
+                response = conn.getresponse()
+                break
+            except socket.timeout:
+                conn.close()
+                raise
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if not reused:
+                    raise URLError(e)
+
+        try:
+            yield response
+        except (socket.timeout, URLError):
+            conn.close()
+            raise
+        except (http.client.HTTPException, OSError) as e:
+            conn.close()
+            raise URLError(e)
+        except BaseException:
+            conn.close()
+            raise
+        self.release(key, conn, response)
+
+    def release(self, key, conn, response):
+        """Put `conn` back into the pool, if `response` left it usable.
+
+        What is left of the body is read first if there isn't much of
+        it (as for a 304, or an error page); otherwise reading it all
+        would cost more than a new connection.
+        """
+        try:
+            if (not response.isclosed() and response.length is not None
+                    and response.length <= 64*1024):
+                response.read()
+        except (http.client.HTTPException, OSError):
+            pass
+        if not response.isclosed() or conn.sock is None:
+            conn.close()
+            return
+        with self.lock:
+            idle = self.idle[key]
+            idle.append(conn)
+            if len(idle) > self.max_idle:
+                idle.pop(0).close()
+
+    def close(self):
+        """Close all idle connections."""
+        with self.lock:
+            for idle in self.idle.values():
+                for conn in idle:
+                    conn.close()
+            self.idle.clear()
+
+def read_feed(court, response, last_checked=None, archive=None):
+    """Parse the feed of `court` from `response`, a 200 response to
+    a request for it, as fetch_feed() does."""
+    body = response
+    if response.headers.get("Content-Encoding") == "gzip":
+        # Compressed, the whole feed is small enough that reading it
+        # all (which lets the connection be reused) costs little; it
+        # is still only inflated as far as it is parsed.
+        body = gzip.GzipFile(fileobj=BytesIO(response.read()))
+    if archive is not None:
+        raw = body.read()
+        archive.write(court, raw)
+        body = BytesIO(raw)
+    feed = parse_feed(body, last_checked)
+    feed.status = response.status
+    feed.etag = response.headers.get("ETag")
+    feed.modified = response.headers.get("Last-Modified")
+    return feed
+
+def fetch_feed(court, validators=None, last_checked=None, url=None,
+               archive=None, pool=None):
+    """Download and parse the RSS feed of `court`.
+
+    `validators` is a dict of HTTP validators ('etag' and 'modified')
+    from a previous fetch of the same feed, as returned by
+    feed_validators(). If given, the request is made conditional,
+    and a feed which has not changed comes back with status 304,
+    no entries, and without its body ever being parsed.
+
+    The feed is parsed while it is downloaded, and the download is
+    abandoned once past `last_checked` (see parse_feed).
+
+    `url` is passed on to feed_url().
+
+    If `archive` (a FeedArchive) is given, the whole feed is downloaded
+    and saved in it before being parsed, instead.
+
+    If `pool` (a ConnectionPool) is given, the feed is fetched over
+    one of its connections, gzipped if the server will. Otherwise a
+    new connection is made with urlopen(), timing out after TIMEOUT
+    seconds.
+
+    Raises URLError (or socket.timeout) if the feed couldn't be
+    fetched, and SAXException if it isn't valid XML.
+    """
+    validators = validators or {}
+    target = feed_url(court, url)
+    headers = {"User-Agent": USER_AGENT}
+    if validators.get('etag'):
+        headers["If-None-Match"] = validators['etag']
+    if validators.get('modified'):
+        headers["If-Modified-Since"] = validators['modified']
+
+    if pool is None:
+        from urllib.request import Request, urlopen
+        try:
+            response = urlopen(Request(target, headers=headers),
+                               timeout=TIMEOUT)
+        except HTTPError as e:
+            if e.code == 304:
+                return Feed(status=304, etag=e.headers.get("ETag"),
+                            modified=e.headers.get("Last-Modified"))
+            raise
+        with response:
+            return read_feed(court, response, last_checked, archive)
+
+    headers["Accept-Encoding"] = "gzip"
+    for _ in range(5):
+        with pool.get(target, headers) as response:
+            if response.status == 304:
+                return Feed(status=304, etag=response.headers.get("ETag"),
+                            modified=response.headers.get("Last-Modified"))
+            location = response.headers.get("Location")
+            if response.status in (301, 302, 303, 307, 308) and location:
+                target = urljoin(target, location)
+                continue
+            if response.status != 200:
+                raise HTTPError(target, response.status, response.reason,
+                                response.headers, None)
+            return read_feed(court, response, last_checked, archive)
+    raise URLError("too many redirects")
+
+def feed_validators(feed, old=None):
+    """The HTTP validators to send with the next fetch of `feed`.
+
+    Servers don't always repeat them in a 304 response,
+    so any missing ones are carried over from `old`.
+    """
+    old = old or {}
+    return {'etag': feed.etag or old.get('etag'),
+            'modified': feed.modified or old.get('modified')}
+
+class StateStore:
+    """Scraper state that should survive restarts,
+    kept in an SQLite database.
+
+    This is checkpointed after every scrape: for each court, the
+    scheduling state of the main loop (`last_updated`, `next_check`,
+    `backoff`, the number of checks in a row which failed, and the
+    recent lastBuildDates the Scheduler learns from)
+    and the HTTP validators of its feed. Restoring it
+    lets a restarted scraper pick up where it left off, without
+    probing every court again or missing entries in between. Sharded
+    instances share one, which is how a court's state is handed over
+    from one to another (see Shard).
+    """
+    def __init__(self, db):
+        # may be shared by several instances (see Shard)
+        self.conn = sqlite3.connect(db, timeout=30)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS validators
+                             (court TEXT PRIMARY KEY, etag TEXT,
+                              modified TEXT)""")
+        # times are stored as UNIX timestamps
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS schedule
+                             (court TEXT PRIMARY KEY, last_updated REAL,
+                              next_check REAL, backoff INTEGER)""")
+        # builds is a JSON list of timestamps, oldest first
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS cadence
+                             (court TEXT PRIMARY KEY, builds TEXT)""")
+        self.conn.commit()
+
+    def load_schedule(self):
+        """Return a dict of court --> (last_updated, next_check, backoff)."""
+        return {court: (datetime.fromtimestamp(last_updated, UTC),
+                        datetime.fromtimestamp(next_check, UTC),
+                        backoff)
+                for court, last_updated, next_check, backoff
+                in self.conn.execute("""SELECT court, last_updated,
+                                        next_check, backoff FROM schedule""")}
+
+    def load_builds(self):
+        """Return a dict of court --> list of recent lastBuildDates."""
+        return {court: [datetime.fromtimestamp(t, UTC)
+                        for t in json.loads(builds)]
+                for court, builds in self.conn.execute(
+                    "SELECT court, builds FROM cadence")}
+
+    def load_validators(self):
+        """Return a dict of court --> validators."""
+        return {court: {'etag': etag, 'modified': modified}
+                for court, etag, modified in self.conn.execute(
+                    "SELECT court, etag, modified FROM validators")}
+
+    def checkpoint(self, court, last_updated, next_check, backoff,
+                   validators=None, builds=None):
+        """Save everything we know about `court` in one transaction."""
+        with self.conn:
+            self.conn.execute("""INSERT OR REPLACE INTO schedule
+                                 (court, last_updated, next_check, backoff)
+                                 VALUES (?, ?, ?, ?)""",
+                              (court, last_updated.timestamp(),
+                               next_check.timestamp(), backoff))
+            if validators:
+                self.conn.execute("""INSERT OR REPLACE INTO validators
+                                     (court, etag, modified)
+                                     VALUES (?, ?, ?)""",
+                                  (court, validators.get('etag'),
+                                   validators.get('modified')))
+            if builds:
+                self.conn.execute("""INSERT OR REPLACE INTO cadence
+                                     (court, builds) VALUES (?, ?)""",
+                                  (court, json.dumps([b.timestamp()
+                                                      for b in builds])))
+
+class SeenStore:
+    """The entries that have been reported, so they are never
+    reported twice, kept in an SQLite database.
+
+    scrape() only deduplicates within one feed. This remembers
+    entries across scrapes (and restarts, if `db` is a file), for
+    when a court's clock goes backwards or it lies about its update
+    time and old entries come round again.
+
+    Only the `size` most recently seen entries are kept, so the
+    database stays bounded; lookups go through its primary key and
+    take about as long with a million entries as with a thousand.
+    Nothing is written until flush(), which scrape() calls once per
+    scrape like it does for notifiers, and then in one short
+    transaction: `db` may be shared with other instances (see Shard),
+    which must not be locked out while the notifiers run.
+    """
+    def __init__(self, db=":memory:", size=1000000):
+        self.size = size
+        # may be shared by several instances, like StateStore
+        self.conn = sqlite3.connect(db, timeout=30)
+        # seq orders entries by when they were last seen
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS seen
+                             (key TEXT PRIMARY KEY, seq INTEGER NOT NULL)
+                             WITHOUT ROWID""")
+        self.conn.execute("""CREATE INDEX IF NOT EXISTS seen_seq
+                             ON seen (seq)""")
+        self.conn.commit()
+        self.seq = self.conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM seen").fetchone()[0]
+        # key --> seq of entries seen since the last flush
+        self.pending = OrderedDict()
+
+    @staticmethod
+    def key(entry):
+        """What identifies an RSSEntry: its LREF if it is a document,
+        or else the docket it was filed on, when, and its title."""
+        if entry.number > 0:
+            return entry.lref
+        return "{} {} {}".format(entry.link,
+                                 timegm(entry.time_filed.utctimetuple()),
+                                 entry.title)
+
+    def add(self, entry):
+        """Remember `entry`. Returns False if it had been seen already."""
+        key = self.key(entry)
+        new = key not in self.pending and self.conn.execute(
+            "SELECT 1 FROM seen WHERE key = ?", (key,)).fetchone() is None
+        self.seq += 1
+        self.pending.pop(key, None)
+        self.pending[key] = self.seq
+        return new
+
+    def flush(self):
+        """Write out the entries seen since the last flush, and forget
+        all but the `size` most recently seen ones.
+
+        If that fails, they are written out with the next flush."""
+        with self.conn:
+            self.conn.executemany("""INSERT INTO seen (key, seq)
+                                     VALUES (?, ?)
+                                     ON CONFLICT(key)
+                                     DO UPDATE SET seq = excluded.seq""",
+                                  self.pending.items())
+            self.conn.execute("DELETE FROM seen WHERE seq <= ?",
+                              (self.seq - self.size,))
+        self.pending.clear()
+
+    def close(self):
+        """Close the database. Unflushed entries are forgotten."""
+        self.conn.close()
+
+class Shard:
+    """This instance's share of the courts, when several scraper
+    processes divide them between themselves.
+
+    Instances keep a heartbeat in a shared SQLite database `db` (the
+    same one as their StateStore, so that the state of a court is
+    handed over along with it), and courts are divided among the live
+    instances by consistent hashing, with `replicas` points on the
+    ring for each instance. Adding or removing an instance only moves
+    the courts that have to move.
+
+    An instance only checks the courts it holds a lease on. A lease is
+    only taken over once its holder has released it, which it does as
+    soon as the court is no longer its own, or let it expire, which a
+    dead instance's leases do after `ttl`. claim() must be called more
+    often than that to renew them.
+    """
+    def __init__(self, db, name, ttl=timedelta(minutes=3), replicas=64,
+                 clock=None):
+        self.name = name
+        self.ttl = ttl
+        self.replicas = replicas
+        self.clock = clock or dtnow
+        self.conn = sqlite3.connect(db, timeout=30, isolation_level=None)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS members
+                             (instance TEXT PRIMARY KEY, expires REAL)""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS leases
+                             (court TEXT PRIMARY KEY, instance TEXT,
+                              expires REAL)""")
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:16], 16)
+
+    def ring(self, members):
+        """The consistent hashing ring of `members`, as a sorted list
+        of (point, member)."""
+        return sorted((self._hash("{}#{}".format(member, i)), member)
+                      for member in members for i in range(self.replicas))
+
+    @classmethod
+    def owner(cls, ring, court):
+        """Which member of `ring` `court` belongs to."""
+        i = bisect_left(ring, (cls._hash(court), ""))
+        return ring[i % len(ring)][1]
+
+    def claim(self, courts):
+        """Renew our heartbeat and leases, take the leases on those of
+        `courts` which are now ours, and release the others.
+
+        Returns the set of courts we hold leases on.
+        """
+        now = self.clock().timestamp()
+        expires = now + self.ttl.total_seconds()
+        # one transaction, so instances take turns
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute("""INSERT OR REPLACE INTO members
+                                 (instance, expires) VALUES (?, ?)""",
+                              (self.name, expires))
+            self.conn.execute("DELETE FROM members WHERE expires <= ?",
+                              (now,))
+            ring = self.ring([member for member, in self.conn.execute(
+                "SELECT instance FROM members")])
+            for court in courts:
+                if self.owner(ring, court) == self.name:
+                    self.conn.execute(
+                        """INSERT INTO leases (court, instance, expires)
+                           VALUES (?, ?, ?)
+                           ON CONFLICT(court) DO UPDATE
+                           SET instance = excluded.instance,
+                               expires = excluded.expires
+                           WHERE leases.instance = excluded.instance
+                              OR leases.expires <= ?""",
+                        (court, self.name, expires, now))
+                else:
+                    self.conn.execute("""DELETE FROM leases
+                                         WHERE court = ? AND instance = ?""",
+                                      (court, self.name))
+            held = {court for court, in self.conn.execute(
+                """SELECT court FROM leases
+                   WHERE instance = ? AND expires > ?""", (self.name, now))}
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return held & set(courts)
+
+    def leave(self):
+        """Give up all our leases and leave, so others needn't wait
+        for them to expire."""
+        with self.conn:
+            self.conn.execute("DELETE FROM leases WHERE instance = ?",
+                              (self.name,))
+            self.conn.execute("DELETE FROM members WHERE instance = ?",
+                              (self.name,))
+
+class Metrics:
+    """Counters, gauges and histograms, for Prometheus to scrape.
+
+    Each is identified by its name, which must be one of METRICS, and
+    its labels, given as keyword arguments. serve() starts an HTTP
+    server answering every request with all of them in the Prometheus
+    text format; render() returns the same text.
+
+    Functions added to `collectors` are called with this object just
+    before rendering, to set gauges which are only worth working out
+    when asked for.
+    """
+    # name --> (type, help)
+    METRICS = OrderedDict([
+        ("pacer_fetch_seconds", ("histogram",
+            "Time taken to fetch a feed, including parsing it "
+            "as it downloads.")),
+        ("pacer_parse_seconds", ("histogram",
+            "Time spent parsing a feed.")),
+        ("pacer_filter_seconds", ("histogram",
+            "Time spent building and filtering RSSEntry objects "
+            "in a scrape.")),
+        ("pacer_notify_seconds", ("histogram",
+            "Time taken by the notifier to report an entry.")),
+        ("pacer_fetch_errors_total", ("counter",
+            "Feeds which could not be fetched or read.")),
+        ("pacer_entries_seen_total", ("counter",
+            "New entries read from feeds.")),
+        ("pacer_entries_filtered_total", ("counter",
+            "New entries dropped by the entry filter.")),
+        ("pacer_entries_reported_total", ("counter",
+            "Entries reported to the notifier.")),
+        ("pacer_next_check_lag_seconds", ("gauge",
+            "How long a court has been due to be checked "
+            "(negative if it isn't yet).")),
+        ("pacer_failures", ("gauge",
+            "Consecutive failed checks of a court.")),
+        ("pacer_circuit_open", ("gauge",
+            "Whether a court is being left alone after failing "
+            "(1 if its circuit is open or half-open).")),
+        ("pacer_recovery_seconds", ("gauge",
+            "How long it took to find a court working again, the last "
+            "time it came back: from its last failed check to the "
+            "first that worked.")),
+    ])
+
+    # Upper bounds of the histogram buckets, in seconds
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+               1, 2.5, 5, 10, 30)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # name --> {labels: value}; for histograms the value is
+        # [count in each bucket, count above the last, sum]
+        self.values = {name: {} for name in self.METRICS}
+        self.collectors = []
+
+    @staticmethod
+    def _labels(labels):
+        return tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """Add `value` to a counter."""
+        key = self._labels(labels)
+        with self.lock:
+            values = self.values[name]
+            values[key] = values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set a gauge."""
+        with self.lock:
+            self.values[name][self._labels(labels)] = value
+
+    def observe(self, name, value, **labels):
+        """Add `value` to a histogram."""
+        key = self._labels(labels)
+        with self.lock:
+            values = self.values[name]
+            if key not in values:
+                values[key] = [0] * (len(self.BUCKETS) + 2)
+            values[key][bisect_left(self.BUCKETS, value)] += 1
+            values[key][-1] += value
+
+    @staticmethod
+    def _format(name, labels, value):
+        if labels:
+            name += "{" + ",".join('{}="{}"'.format(
+                k, str(v).replace("\\", "\\\\").replace('"', '\\"')
+                .replace("\n", "\\n")) for k, v in labels) + "}"
+        return "{} {}\n".format(name, repr(float(value)))
+
+    def render(self):
+        """All metrics in the Prometheus text format."""
+        for collect in self.collectors:
+            collect(self)
+
+        lines = []
+        with self.lock:
+            for name, (kind, text) in self.METRICS.items():
+                lines.append("# HELP {} {}\n# TYPE {} {}\n".format(
+                    name, text, name, kind))
+                for labels, value in sorted(self.values[name].items()):
+                    if kind != "histogram":
+                        lines.append(self._format(name, labels, value))
+                        continue
+                    count = 0
+                    for le, n in zip(self.BUCKETS + ("+Inf",), value):
+                        count += n
+                        lines.append(self._format(
+                            name + "_bucket", labels + (("le", le),), count))
+                    lines.append(self._format(name + "_sum", labels,
+                                              value[-1]))
+                    lines.append(self._format(name + "_count", labels,
+                                              count))
+        return "".join(lines)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve the metrics over HTTP from a background thread, on
+        `host` (by default, only to this machine). Returns the server;
+        call shutdown() on it to stop."""
+        server = MetricsServer((host, port), MetricsHandler)
+        server.metrics = self
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+class MetricsServer(socketserver.ThreadingMixIn, HTTPServer):
+    """HTTP server for Metrics.serve()."""
+    daemon_threads = True
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Answers every GET with the server's metrics."""
+    timeout = TIMEOUT
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = self.server.metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class FeedArchive:
+    """An append-only archive of raw feeds, in the directory `path`.
+
+    Each feed is compressed as a gzip member of its own and appended to
+    the current segment file, so any one of them can be read back by
+    seeking to it. A new segment is started once the current one
+    reaches `segment_size` bytes or `segment_age` in age. An SQLite
+    index (index.db) records where each feed is, by court and fetch
+    time.
+
+    snapshots() reads them back, and replay() runs them through scrape().
+    """
+    def __init__(self, path, segment_size=64*1024*1024,
+                 segment_age=timedelta(days=1)):
+        self.path = path
+        self.segment_size = segment_size
+        self.segment_age = segment_age
+        os.makedirs(path, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(path, "index.db"),
+                                    check_same_thread=False)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS segments
+                             (id INTEGER PRIMARY KEY, created REAL)""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS snapshots
+                             (court TEXT, fetched REAL, segment INTEGER,
+                              offset INTEGER, length INTEGER)""")
+        self.conn.execute("""CREATE INDEX IF NOT EXISTS snapshots_court
+                             ON snapshots (court, fetched)""")
+        self.conn.execute("""CREATE INDEX IF NOT EXISTS snapshots_fetched
+                             ON snapshots (fetched)""")
+        self.conn.commit()
+        # the segment being written to: (id, created, file)
+        self.segment = None
+
+    def segment_path(self, segment):
+        """Where segment number `segment` is."""
+        return os.path.join(self.path, "{:08d}.gz".format(segment))
+
+    def _segment(self, now):
+        """The segment to append to at `now`, rotating if it is due."""
+        if self.segment is None:
+            row = self.conn.execute("""SELECT id, created FROM segments
+                                       ORDER BY id DESC LIMIT 1""").fetchone()
+            if row:
+                self.segment = (row[0], row[1],
+                                open(self.segment_path(row[0]), 'ab'))
+
+        if self.segment is not None:
+            segment, created, f = self.segment
+            if (f.tell() < self.segment_size and
+                    now - created < self.segment_age.total_seconds()):
+                return self.segment
+            f.close()
+
+        with self.conn:
+            segment = self.conn.execute(
+                "INSERT INTO segments (created) VALUES (?)", (now,)).lastrowid
+        self.segment = (segment, now, open(self.segment_path(segment), 'ab'))
+        return self.segment
+
+    def write(self, court, body, fetched=None):
+        """Archive `body`, the feed of `court` fetched at `fetched`
+        (an offset-aware datetime; by default, now)."""
+        fetched = (fetched or dtnow()).timestamp()
+        # This runs in the fetch threads. On ECF feeds, level 9 takes
+        # nearly twice as long as 6, for output only 5% smaller.
+        data = gzip.compress(body, 6)
+        with self.lock:
+            segment, _, f = self._segment(fetched)
+            offset = f.tell()
+            f.write(data)
+            f.flush()
+            with self.conn:
+                self.conn.execute("""INSERT INTO snapshots
+                                     (court, fetched, segment, offset, length)
+                                     VALUES (?, ?, ?, ?, ?)""",
+                                  (court, fetched, segment, offset,
+                                   len(data)))
+
+    def snapshots(self, courts=None, since=None, until=None):
+        """Yield (court, fetched, body) for every archived feed of
+        `courts` (by default, all of them) fetched from `since` up to
+        `until`, in the order they were fetched."""
+        query = "SELECT court, fetched, segment, offset, length FROM snapshots"
+        where, args = [], []
+        if courts is not None:
+            courts = list(courts)
+            where.append("court IN ({})".format(",".join("?" * len(courts))))
+            args += courts
+        if since is not None:
+            where.append("fetched >= ?")
+            args.append(since.timestamp())
+        if until is not None:
+            where.append("fetched < ?")
+            args.append(until.timestamp())
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY fetched",
+                                     args).fetchall()
+
+        files = {}
+        try:
+            for court, fetched, segment, offset, length in rows:
+                if segment not in files:
+                    files[segment] = open(self.segment_path(segment), 'rb')
+                f = files[segment]
+                f.seek(offset)
+                yield (court, datetime.fromtimestamp(fetched, UTC),
+                       gzip.decompress(f.read(length)))
+        finally:
+            for f in files.values():
+                f.close()
+
+    def replay(self, entry_filter, notifier, courts=None, since=None,
+               until=None):
+        """Run the archived feeds through scrape() as if they were
+        being fetched again, and return a dict of court --> when
+        it was last updated, like the main loop keeps.
+
+        Only entries after `since` (by default, all) are reported.
+        """
+        start = since or datetime.fromtimestamp(0, UTC)
+        last_updated = {}
+        for court, _, body in self.snapshots(courts, since, until):
+            last_checked = last_updated.get(court, start)
+            feed = parse_feed(BytesIO(body), last_checked)
+            last_updated[court] = scrape(court, entry_filter, last_checked,
+                                         notifier, feed)
+        return last_updated
+
+    def close(self):
+        """Close the current segment and the index."""
+        with self.lock:
+            if self.segment is not None:
+                self.segment[2].close()
+                self.segment = None
+            self.conn.close()
+
+class FeedFetcher:
+    """Fetch the feeds of many courts concurrently.
+
+    Feeds are downloaded and parsed by a bounded pool of worker
+    threads, with at most `per_host` requests in flight to any
+    single host at once. A few dead ECF servers will then only
+    hold up their own courts instead of the whole cycle.
+
+    Feeds are fetched over the keep-alive connections of
+    `connections`, a ConnectionPool (by default, a new one).
+
+    `url` and `archive` are passed on to fetch_feed(). How long the last
+    fetch of each court took, in seconds, is kept in `latency`, and
+    recorded in `metrics` (a Metrics) if given.
+    """
+    def __init__(self, max_workers=8, per_host=1, url=None, metrics=None,
+                 archive=None, connections=None):
+        self.pool = ThreadPoolExecutor(max_workers)
+        self.connections = connections or ConnectionPool()
+        self.per_host = per_host
+        self.url = url
+        self.metrics = metrics
+        self.archive = archive
+        self.latency = {}
+        # host -> semaphore capping requests in flight to that host
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+
+    def _host_slot(self, court):
+        """The semaphore guarding the host that serves `court`."""
+        host = urlsplit(feed_url(court, self.url)).netloc
+        with self._hosts_lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return self._hosts[host]
+
+    def _fetch(self, court, validators, last_checked):
+        with self._host_slot(court):
+            start = monotonic()
+            try:
+                feed = fetch_feed(court, validators, last_checked, self.url,
+                                  self.archive, self.connections)
+                if self.metrics and feed.status != 304:
+                    self.metrics.observe("pacer_parse_seconds",
+                                         feed.parse_time, court=court)
+                return feed
+            finally:
+                self.latency[court] = monotonic() - start
+                if self.metrics:
+                    self.metrics.observe("pacer_fetch_seconds",
+                                         self.latency[court], court=court)
+
+    def fetch(self, courts, validators=None, last_checked=None):
+        """Start fetching the feeds of `courts`.
+
+        `validators` and `last_checked` map courts to the arguments
+        of the same names to fetch_feed().
+
+        Returns an OrderedDict of court --> Future, in the same order
+        as `courts`. Calling result() on a Future returns the parsed
+        feed, or re-raises the exception that fetching it raised, so
+        results can be handled one court at a time just as if
+        fetch_feed() had been called directly.
+        """
+        validators = validators or {}
+        last_checked = last_checked or {}
+        return OrderedDict(
+            (court, self.pool.submit(self._fetch, court,
+                                     validators.get(court),
+                                     last_checked.get(court)))
+            for court in courts)
+
+    def shutdown(self):
+        """Stop the worker threads. Fetches in flight are abandoned."""
+        self.pool.shutdown(wait=False)
+        self.connections.close()
+
+class CircuitBreaker:
+    """Decides how long to leave a court alone after checking it fails.
+
+    A court's circuit is closed as long as checks of it work. After
+    `threshold` failures in a row it opens: the court is left alone
+    for `base`, doubling with each further failure up to `cap`. Each
+    wait is jittered (by up to half of it) so that courts which went
+    down together aren't all retried together. Once the wait is over
+    the circuit is half-open, and the next check is a probe: a single
+    conditional GET, which costs a server that is back only a 304 if
+    the feed hasn't changed. If it works the circuit closes again;
+    otherwise it reopens, for longer.
+
+    How long it took to find each court working again, from its last
+    failed check to the check that worked, is kept in `recovery`.
+    """
+    def __init__(self, base=timedelta(minutes=5), cap=timedelta(hours=1),
+                 threshold=2, rng=random):
+        self.base = base
+        self.cap = cap
+        self.threshold = threshold
+        self.rng = rng
+        # court --> consecutive failed checks
+        self.failures = defaultdict(int)
+        # court --> when it last failed, and when to try it again
+        self.failed = {}
+        self.retry = {}
+        # court --> timedelta
+        self.recovery = {}
+
+    def state(self, court, now):
+        """"closed", "open" or "half-open"."""
+        if self.failures[court] < self.threshold:
+            return "closed"
+        if now < self.retry.get(court, now):
+            return "open"
+        return "half-open"
+
+    def delay(self, failures):
+        """How long to wait after `failures` failures in a row,
+        before jitter."""
+        if failures < self.threshold:
+            return self.base
+        # capped before multiplying, which would overflow a timedelta
+        # after a few dozen failures
+        return self.base * min(2**(failures - self.threshold),
+                               self.cap / self.base)
+
+    def failure(self, court, now):
+        """Count a failed check of `court` at `now`, and return when
+        to check it next."""
+        self.failures[court] += 1
+        delay = self.delay(self.failures[court])
+        if self.failures[court] >= self.threshold:
+            delay -= delay * self.rng.random() / 2
+        self.failed[court] = now
+        self.retry[court] = now + delay
+        return self.retry[court]
+
+    def success(self, court, now):
+        """Count a check of `court` at `now` which worked. Returns how
+        long it took to find it working again if its circuit was open
+        (and when it last failed is known), and None otherwise."""
+        recovery = None
+        if self.failures[court] >= self.threshold and court in self.failed:
+            recovery = self.recovery[court] = now - self.failed[court]
+        self.forget(court)
+        return recovery
+
+    def forget(self, court):
+        """Forget everything about `court` but its last recovery."""
+        for table in (self.failures, self.failed, self.retry):
+            table.pop(court, None)
+
+class Scheduler(dict):
+    """A dict of court --> when it should next be checked,
+    which learns how often each court's feed is rebuilt.
+
+    Courts are also kept in a heap by due time, so that the courts
+    which are due, and how long to sleep until the next one, are
+    found without scanning them all. Setting a court's time pushes
+    a new heap entry; outdated ones are skipped when they come up.
+
+    reschedule() polls each court about as often as its feed has
+    been rebuilt recently: the median gap between its last `history`
+    distinct lastBuildDates, bounded by `min_interval` and
+    `max_interval`, plus `slack` for the rebuild to actually happen.
+    Until a gap has been seen, courts are polled at `min_interval`;
+    polling faster than a court is rebuilt is what lets its real
+    cadence be seen in the first place.
+    """
+    def __init__(self, min_interval=timedelta(minutes=5),
+                 max_interval=timedelta(hours=2),
+                 slack=timedelta(minutes=1), history=9):
+        dict.__init__(self)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.slack = slack
+        self.heap = []
+        # court --> recent lastBuildDates, oldest first
+        self.builds = defaultdict(lambda: deque(maxlen=history))
+
+    def __setitem__(self, court, when):
+        dict.__setitem__(self, court, when)
+        heapq.heappush(self.heap, (when, court))
+
+    def _prune(self):
+        """Drop outdated entries from the top of the heap."""
+        while self.heap and self.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+
+    def next_due(self):
+        """When the next court is due, or None if there are none."""
+        self._prune()
+        return self.heap[0][0] if self.heap else None
+
+    def due(self, now):
+        """The courts due by `now`, most overdue first.
+
+        They stay scheduled where they are until they are given
+        a new time, so a court is never lost if that doesn't happen.
+        """
+        due = OrderedDict()
+        while self.heap and self.heap[0][0] <= now:
+            when, court = heapq.heappop(self.heap)
+            if self.get(court) == when:
+                due[court] = when
+        for court, when in due.items():
+            heapq.heappush(self.heap, (when, court))
+        return list(due)
+
+    def _bound(self, interval):
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def interval(self, court):
+        """How often `court` is rebuilt, as far as we know."""
+        builds = self.builds[court]
+        gaps = sorted(b - a for a, b in zip(builds, list(builds)[1:]))
+        if not gaps:
+            return self.min_interval
+        return self._bound(gaps[len(gaps)//2])
+
+    def reschedule(self, court, last_updated, now):
+        """Schedule the next check of `court`, after a check at `now`
+        found it was last rebuilt at `last_updated`. Returns when."""
+        builds = self.builds[court]
+        if not builds or last_updated > builds[-1]:
+            builds.append(last_updated)
+
+        when = last_updated + self.interval(court) + self.slack
+        if when <= now:
+            # The rebuild is late. Try again soon, then back off
+            # for as long as the court stays quiet. Until a rebuild
+            # has been seen, there is nothing to be late for.
+            late = now - when if len(builds) > 1 else timedelta(0)
+            when = now + self._bound(late)
+        self[court] = when
+        return when
+
+    def overflowed(self, court, last_updated, now):
+        """Check `court` again soon, after its feed was found to have
+        overflowed (see Feed.overflowed). What was learnt about its
+        cadence is forgotten, since it evidently wasn't enough."""
+        self.builds[court].clear()
+        self.builds[court].append(last_updated)
+        self[court] = now + self.min_interval
+        return self[court]
+
+
+def scrape(court, entry_filter, last_checked, notifier, feed=None,
+           seen=None, metrics=None):
     """Scrape for certain cases in the given court.
 
     Arguments:
@@ -227,26 +1525,42 @@ def scrape(court, entry_filter, last_checked, notifier):
     - entry_filter: predicate returning whether an entry should be reported
                     The predicate should take a single argument, an RSSEntry
                     object, and return a boolean value.
+                    If it has a `prefilter` attribute, that is first called
+                    with the raw feed entry (a dict), and entries it
+                    rejects are skipped without building an RSSEntry.
     - last_checked: an offset-aware datetime object representing
                     the point at which we should stop scraping
                     Recommended value: the return value of the last
                     invocation of this function on this court.
     - notifier: result of calling make_notifier
                 Or in general, any function which takes an RSSEntry object.
+    - feed: the already-fetched Feed of `court` (see FeedFetcher)
+            If not given, the feed is fetched here with fetch_feed().
+            It must have been read at least as far as `last_checked`.
+    - seen: a SeenStore of entries reported before
+            Entries found in it are not reported again.
+    - metrics: a Metrics to count entries and time notifications in
 
     Returns:
         when the scraped feed was generated as an offset-aware datetime object
     """
-    feed = feedparser.parse(
-        "https://ecf.{}.uscourts.gov/cgi-bin/rss_outside.pl".format(court))
-    if feed.bozo and feed.bozo_exception:
-        raise feed.bozo_exception
+    if feed is None:
+        feed = fetch_feed(court, last_checked=last_checked)
+
+    if feed.status == 304:
+        # Conditional request: nothing has changed since last time.
+        log.debug("{} has not been updated (304).".format(court))
+        return last_checked
 
     # We key entries on their URLs so we can detect duplicates.
     # OrderedDict is used to keep them in chronological order.
     entries = OrderedDict()
 
-    last_updated = st2dt(feed['feed']['updated_parsed'])
+    if feed.updated is None:
+        # No lastBuildDate. Go by the latest entry instead (see below).
+        last_updated = datetime.fromtimestamp(0, UTC)
+    else:
+        last_updated = st2dt(feed.updated)
 
     # Ignore the feed if it has no entries. Yes, this really does happen:
     #
@@ -265,20 +1579,20 @@ def scrape(court, entry_filter, last_checked, notifier):
     # </channel>
     # </rss>
 
-    if len(feed['entries']) == 0:
-        return last_updated
+    if len(feed.entries) == 0:
+        return last_updated if feed.updated is not None else last_checked
 
     # Check to make sure that last_updated is at least as recent as the first
     # (most recent) entry. This constraint *should* always hold but has not
     # on occasion in the District for the Northern Mariana Islands.
 
-    latest_entry_time = st2dt(feed['entries'][0]['published_parsed'])
-    if latest_entry_time > last_updated:
+    latest_entry_time = st2dt(feed.entries[0]['published_parsed'])
+    if feed.updated is not None and latest_entry_time > last_updated:
         log.error("{} IS LYING ABOUT UPDATE TIME! ".format(court) +
                   "Claimed {} but latest entry is from {}. ".format(
                       dtfmt(last_updated), dtfmt(latest_entry_time))+
                   "Attempting to recover...")
-        last_updated = latest_entry_time
+    last_updated = max(last_updated, latest_entry_time)
 
     if last_updated <= last_checked:
         log.debug("{} has not been updated.".format(court))
@@ -286,15 +1600,24 @@ def scrape(court, entry_filter, last_checked, notifier):
 
     log.debug("{} was updated at {}.".format(court, dtfmt(last_updated)))
 
-    for entry in feed['entries']:
+    prefilter = getattr(entry_filter, 'prefilter', None)
+    new = matched = 0
+    start = monotonic()
+
+    for entry in feed.entries:
         if st2dt(entry['published_parsed']) <= last_checked:
             # We have checked all new entries.
             log.debug("Read all new entries for {}.".format(court))
             break
+        new += 1
+
+        if prefilter is not None and not prefilter(entry):
+            continue
 
         info = RSSEntry(entry)
 
         if entry_filter(info):
+            matched += 1
             log.debug(info)
 
             # Deduplication
@@ -311,13 +1634,28 @@ def scrape(court, entry_filter, last_checked, notifier):
             else:
                 entries[info.link] = info
 
+    if metrics:
+        metrics.observe("pacer_filter_seconds", monotonic() - start,
+                        court=court)
+        metrics.inc("pacer_entries_seen_total", new, court=court)
+        metrics.inc("pacer_entries_filtered_total", new - matched,
+                    court=court)
+
     # report entries in what *should* be chronological order
     for entry in reversed(list(entries.values())):
+        if seen is not None and not seen.add(entry):
+            log.info("already reported: {}".format(entry.lref))
+            continue
+
         log.info("reporting the following:")
         log.info(entry)
 
         try:
+            start = monotonic()
             notifier(entry)
+            if metrics:
+                metrics.observe("pacer_notify_seconds", monotonic() - start)
+                metrics.inc("pacer_entries_reported_total", court=court)
         except Exception:
             # Catch exceptions here in attempt to prevent
             # throwing an exception without returning the
@@ -326,6 +1664,20 @@ def scrape(court, entry_filter, last_checked, notifier):
             # sys.exit() is also caught.
             log.exception(entry)
 
+    # Notifiers that batch their work (like SQLiteSink)
+    # get to do it once per scrape.
+    if entries and hasattr(notifier, 'flush'):
+        try:
+            notifier.flush()
+        except Exception:
+            log.exception("flushing notifications for {}".format(court))
+    if entries and seen is not None:
+        try:
+            seen.flush()
+        except sqlite3.Error:
+            # they are still remembered, and written out next time
+            log.exception("remembering entries seen in {}".format(court))
+
     log.debug("Scrape of {} completed.".format(court))
     return last_updated
 
@@ -355,12 +1707,8 @@ def dtfmt(dt):
 
 ###################
 
-def send_tweet(entry, oauth_token, oauth_secret, consumer_key, consumer_secret):
-    """entry should be an RSSEntry object."""
-
-    twitter = Twitter(auth=OAuth(oauth_token, oauth_secret,
-                                 consumer_key, consumer_secret))
-
+def tweet_text(entry):
+    """The status to tweet about `entry`, an RSSEntry object."""
     case = entry.case_name
     title = entry.title
     link = entry.link
@@ -387,15 +1735,164 @@ def send_tweet(entry, oauth_token, oauth_secret, consumer_key, consumer_secret):
         case, entry.court, number, title)
 
     message += link
+    return message
+
+class TokenBucket:
+    """Rate limiter allowing bursts of up to `capacity` events,
+    refilled at `rate` events per second.
+
+    take() waits until an event is allowed, so bursts are smoothed
+    out rather than dropped. `clock` and `sleep` can be replaced
+    (e.g. for testing); `clock` must be monotonic.
+    """
+    def __init__(self, rate, capacity, clock=monotonic, sleep=sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated = clock()
+        # no events at all until then (see limit)
+        self.blocked_until = self.updated
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return now
+
+    def take(self):
+        """Wait until an event is allowed, and use it up."""
+        with self.lock:
+            while True:
+                now = self._refill()
+                if self.blocked_until > now:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+                self.sleep(wait)
+
+    def limit(self, remaining, reset):
+        """Apply a server's own rate limit: `remaining` more events
+        are allowed until the UNIX time `reset`."""
+        with self.lock:
+            now = self._refill()
+            self.tokens = min(self.tokens, remaining)
+            if remaining <= 0:
+                self.blocked_until = max(
+                    self.blocked_until,
+                    now + reset - dtnow().timestamp())
+
+class TwitterPublisher:
+    """Tweet entries from one shared API client.
+
+    Tweets are paced by a TokenBucket (by default a burst of 15, then
+    Twitter's limit of 300 every 3 hours), which also follows the
+    X-Rate-Limit-* headers Twitter sends back; when rate limited, we
+    wait until the limit resets and try again. Because of all the
+    waiting, this is best used in a DispatchQueue lane.
+
+    The last `dedup_size` statuses are remembered, and duplicates
+    are skipped without asking Twitter.
+
+    `domain` and `secure` are passed to the client, e.g. to
+    use a stand-in for the Twitter API.
+    """
+    def __init__(self, oauth_token, oauth_secret, consumer_key,
+                 consumer_secret, bucket=None, dedup_size=1000,
+                 domain="api.twitter.com", secure=True):
+        from twitter import Twitter, OAuth
+        self.twitter = Twitter(auth=OAuth(oauth_token, oauth_secret,
+                                          consumer_key, consumer_secret),
+                               domain=domain, secure=secure)
+        self.bucket = bucket or TokenBucket(300 / (3*60*60), 15)
+        self.dedup_size = dedup_size
+        # recently posted statuses, oldest first
+        self.recent = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _remember(self, message):
+        with self.lock:
+            self.recent[message] = True
+            while len(self.recent) > self.dedup_size:
+                self.recent.popitem(last=False)
+
+    def _limit(self, headers):
+        """Update the bucket from rate limit headers, if any."""
+        if headers and 'X-Rate-Limit-Remaining' in headers:
+            self.bucket.limit(int(headers['X-Rate-Limit-Remaining']),
+                              int(headers.get('X-Rate-Limit-Reset', 0)))
+
+    @staticmethod
+    def is_duplicate(error):
+        """Whether TwitterHTTPError `error` was Twitter
+        rejecting a duplicate status."""
+        data = error.response_data
+        return isinstance(data, dict) and any(
+            e.get('code') == 187 for e in data.get('errors', []))
+
+    def __call__(self, entry):
+        from twitter import TwitterHTTPError
+        message = tweet_text(entry)
+        with self.lock:
+            if message in self.recent:
+                log.info("Not tweeting duplicate \"{}\"".format(message))
+                return
+
+        while True:
+            self.bucket.take()
+            try:
+                response = self.twitter.statuses.update(
+                    status=message, _timeout=TIMEOUT)
+            except TwitterHTTPError as e:
+                self._limit(e.e.headers)
+                if e.e.code == 429:
+                    # Wait at least a minute, even if the headers are
+                    # missing or claim the limit has already reset.
+                    self.bucket.limit(0, dtnow().timestamp() + 60)
+                    log.warning("Rate limited by Twitter. Waiting.")
+                    continue
+                if self.is_duplicate(e):
+                    log.info("Twitter says \"{}\" is a duplicate.".format(
+                        message))
+                    self._remember(message)
+                    return
+                raise
+
+            self._limit(response.headers)
+            self._remember(message)
+            log.info("Successfully tweeted: \"{}\"".format(message))
+            return
+
+# credentials -> TwitterPublisher used by send_tweet
+twitter_publishers = {}
+
+def send_tweet(entry, oauth_token, oauth_secret, consumer_key, consumer_secret):
+    """entry should be an RSSEntry object.
+
+    One client is kept per set of credentials; see TwitterPublisher.
+    """
+    from twitter import TwitterHTTPError
+    key = (oauth_token, oauth_secret, consumer_key, consumer_secret)
+    if key not in twitter_publishers:
+        twitter_publishers[key] = TwitterPublisher(*key)
 
     try:
-        twitter.statuses.update(status=message)
-        log.info("Successfully tweeted: \"{}\"".format(message))
+        twitter_publishers[key](entry)
     except TwitterHTTPError:
-        log.exception("Tweet failed. Probably a duplicate.")
+        log.exception("Tweet failed.")
 
 def sql_notifier(entry, db):
-    """Log reported entries to an SQLite3 database."""
+    """Log reported entries to an SQLite3 database.
+
+    This connects and commits once per entry; SQLiteSink is
+    much faster, and also creates the table.
+    """
     if entry.number == 0:
         # Abort --- it won't have a sensible LREF
         return
@@ -405,31 +1902,537 @@ def sql_notifier(entry, db):
     c.execute("""INSERT INTO filings
                  (time, lref, case_name, number, title, pacer, court)
                  VALUES (?, ?, ?, ?, ?, ?, ?)""",
-              (timegm(entry.time_filed), entry.LREF, entry.case_name,
-               entry.number, entry.title, entry.link, entry.court))
+              (timegm(entry.time_filed.utctimetuple()), entry.lref,
+               entry.case_name, entry.number, entry.title, entry.link,
+               entry.court))
 
     conn.commit()
     c.close()
 
     log.debug("sql-logged {}".format(entry.lref))
 
+FILINGS_FTS = ("title", "case_name", "caption", "court", "lref")
+
+def index_filings(conn):
+    """Create a full-text index (filings_fts) over the filings table
+    on `conn`, if there isn't one, and triggers which keep it up to
+    date as filings are written.
+
+    The index is an external-content FTS5 table, so it only holds the
+    index itself. Filings already in the table are indexed when it is
+    created. Returns whether there is an index; there isn't one if this
+    SQLite was built without FTS5.
+    """
+    if conn.execute("""SELECT 1 FROM sqlite_master
+                       WHERE name = 'filings_fts'""").fetchone():
+        return True
+
+    columns = ", ".join(FILINGS_FTS)
+    new = ", ".join("new." + c for c in FILINGS_FTS)
+    old = ", ".join("old." + c for c in FILINGS_FTS)
+    try:
+        conn.execute("""CREATE VIRTUAL TABLE filings_fts USING fts5
+                        ({}, content='filings', content_rowid='rowid')"""
+                     .format(columns))
+    except sqlite3.OperationalError as e:
+        log.warning("Not indexing filings: {}".format(e))
+        return False
+    conn.execute("""CREATE TRIGGER filings_fts_insert AFTER INSERT ON filings
+                    BEGIN
+                        INSERT INTO filings_fts (rowid, {0})
+                        VALUES (new.rowid, {1});
+                    END""".format(columns, new))
+    conn.execute("""CREATE TRIGGER filings_fts_delete AFTER DELETE ON filings
+                    BEGIN
+                        INSERT INTO filings_fts (filings_fts, rowid, {0})
+                        VALUES ('delete', old.rowid, {1});
+                    END""".format(columns, old))
+    conn.execute("""CREATE TRIGGER filings_fts_update AFTER UPDATE ON filings
+                    BEGIN
+                        INSERT INTO filings_fts (filings_fts, rowid, {0})
+                        VALUES ('delete', old.rowid, {1});
+                        INSERT INTO filings_fts (rowid, {0})
+                        VALUES (new.rowid, {2});
+                    END""".format(columns, old, new))
+    conn.execute("INSERT INTO filings_fts (filings_fts) VALUES ('rebuild')")
+    return True
+
+def search_filings(db, query=None, courts=None, since=None, until=None,
+                   limit=20):
+    """Search the filings recorded by SQLiteSink in `db`, those recorded
+    last first (which, as the scraper goes, is about the order they
+    were filed in).
+
+    `query` is an FTS5 query over title, case_name, caption, court
+    and lref: words, "quoted phrases", prefix*, AND/OR/NOT, and
+    column:word. Without one, every filing matches. Results can be
+    limited to `courts`, and to those filed from `since` up to `until`
+    (offset-aware datetimes).
+
+    Returns a list of dicts with the columns of the filings table,
+    `time` as a datetime. Raises sqlite3.OperationalError for a
+    malformed query.
+    """
+    conn = sqlite3.connect(db)
+    conn.row_factory = sqlite3.Row
+    where, args = [], []
+    if query:
+        match = "({})".format(query)
+        if courts:
+            # The index is much faster at this than the filings table.
+            match += " AND court : ({})".format(" OR ".join(
+                '"{}"'.format(court.replace('"', '""'))
+                for court in courts))
+        sql = """SELECT filings.* FROM filings_fts
+                 JOIN filings ON filings.rowid = filings_fts.rowid"""
+        where.append("filings_fts MATCH ?")
+        args.append(match)
+        # The index can be read in rowid order, and so stop at `limit`;
+        # ordering by anything else would mean sorting every match.
+        order = "filings_fts.rowid"
+    else:
+        sql = "SELECT * FROM filings"
+        order = "rowid"
+        if courts:
+            courts = list(courts)
+            where.append("court IN ({})".format(",".join("?" * len(courts))))
+            args += courts
+    if since is not None:
+        where.append("time >= ?")
+        args.append(timegm(since.utctimetuple()))
+    if until is not None:
+        where.append("time < ?")
+        args.append(timegm(until.utctimetuple()))
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY {} DESC LIMIT ?".format(order)
+    args.append(limit)
+
+    try:
+        results = []
+        for row in conn.execute(sql, args):
+            result = dict(zip(row.keys(), row))
+            result['time'] = datetime.fromtimestamp(result['time'], UTC)
+            results.append(result)
+        return results
+    finally:
+        conn.close()
+
+class SQLiteSink:
+    """Log reported entries to an SQLite3 database, in batches.
+
+    The same table as sql_notifier (created if necessary, along with
+    its full-text index, or brought up to date if sql_notifier made
+    it), but over a single long-lived connection in WAL mode. Entries
+    are held until flush(), which scrape() calls after reporting, so each
+    scrape costs one transaction instead of one per entry. Entries
+    are keyed on LREF, so reporting one again just updates it.
+    """
+    def __init__(self, db):
+        self.conn = sqlite3.connect(db, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode this can only lose the last few transactions
+        # in a power failure, never corrupt the database.
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS filings
+                                 (time INTEGER, lref TEXT NOT NULL,
+                                  case_name TEXT, number INTEGER,
+                                  title TEXT, pacer TEXT, court TEXT,
+                                  caption TEXT)""")
+            # A table made for sql_notifier has no caption, and may
+            # have some filings in it more than once.
+            columns = [column[1] for column in self.conn.execute(
+                "PRAGMA table_info(filings)")]
+            if "caption" not in columns:
+                self.conn.execute(
+                    "ALTER TABLE filings ADD COLUMN caption TEXT")
+            if not self.conn.execute("""SELECT 1 FROM sqlite_master
+                                        WHERE name = 'filings_lref'""") \
+                    .fetchone():
+                self.conn.execute("""DELETE FROM filings WHERE rowid NOT IN
+                                     (SELECT MAX(rowid) FROM filings
+                                      GROUP BY lref)""")
+            self.conn.execute("""CREATE UNIQUE INDEX IF NOT EXISTS
+                                 filings_lref ON filings (lref)""")
+            self.conn.execute("""CREATE INDEX IF NOT EXISTS
+                                 filings_time ON filings (time)""")
+            index_filings(self.conn)
+        self.pending = []
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def row(entry):
+        """The row of the filings table for `entry`."""
+        return (timegm(entry.time_filed.utctimetuple()), entry.lref,
+                entry.case_name, entry.number, entry.title, entry.link,
+                entry.court, entry.case)
+
+    def __call__(self, entry):
+        if entry.number == 0:
+            # Abort --- it won't have a sensible LREF
+            return
+        with self.lock:
+            self.pending.append(self.row(entry))
+
+    def flush(self):
+        """Write out all pending entries in one transaction.
+
+        If that fails, they stay pending for the next flush."""
+        with self.lock:
+            rows = self.pending
+            if not rows:
+                return
+            with self.conn:
+                self.conn.executemany(
+                    """INSERT INTO filings (time, lref, case_name, number,
+                                            title, pacer, court, caption)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (lref) DO UPDATE SET
+                           time = excluded.time,
+                           case_name = excluded.case_name,
+                           number = excluded.number,
+                           title = excluded.title,
+                           pacer = excluded.pacer,
+                           court = excluded.court,
+                           caption = excluded.caption""", rows)
+            self.pending = []
+        log.debug("sql-logged {} entries".format(len(rows)))
+
+    def close(self):
+        """Flush and close the database."""
+        self.flush()
+        self.conn.close()
+
+class EmailNotifier:
+    """Send emails about entries from `account` to `to`
+    (an address or a list of them).
+
+    All emails go over one SMTP session, which is opened when first
+    needed and reopened if the server has dropped it, instead of
+    connecting and logging in again for every entry.
+
+    If `digest` is "recipient" or "case", entries are held until
+    flush(), which scrape() calls once per scrape, and then sent
+    as one email per recipient or one per case respectively.
+    """
+    def __init__(self, account, password, to, host="smtp.gmail.com",
+                 port=587, starttls=True, digest=None):
+        if digest not in (None, "recipient", "case"):
+            raise ValueError("Unknown digest mode {!r}".format(digest))
+        self.account = account
+        self.password = password
+        self.to = [to] if isinstance(to, str) else list(to)
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.digest = digest
+        self.smtp = None
+        self.pending = []
+        # (entries, to) of digests which failed to be sent
+        self.unsent = []
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        """Open and log in to a new SMTP session."""
+        import smtplib
+        s = smtplib.SMTP(self.host, self.port, timeout=TIMEOUT)
+        if self.starttls:
+            s.starttls()
+        if self.password:
+            s.login(self.account, self.password)
+        log.debug("Connected to {}:{}.".format(self.host, self.port))
+        return s
+
+    def _send(self, message, to):
+        """Send `message`, reconnecting once if the session was lost."""
+        import smtplib
+        for retry in (False, True):
+            if self.smtp is None:
+                self.smtp = self._connect()
+            try:
+                self.smtp.send_message(message, from_addr=self.account,
+                                       to_addrs=to)
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # servers drop idle sessions after a while
+                self.smtp = None
+                if retry:
+                    raise
+
+    @staticmethod
+    def message(entries):
+        """Compose an email about `entries`."""
+        from email.mime.text import MIMEText
+        message = MIMEText("\n\n".join(str(e) for e in entries))
+        case_names = {e.case_name for e in entries}
+        if len(entries) == 1:
+            message['Subject'] = "New PACER entry in {}".format(
+                entries[0].case_name)
+        elif len(case_names) == 1:
+            message['Subject'] = "{} new PACER entries in {}".format(
+                len(entries), entries[0].case_name)
+        else:
+            message['Subject'] = "{} new PACER entries".format(len(entries))
+        message['From'] = "pacerrssscraper"
+        return message
+
+    def __call__(self, entry):
+        with self.lock:
+            if self.digest:
+                self.pending.append(entry)
+            else:
+                self._send(self.message([entry]), self.to)
+
+    def flush(self):
+        """Send the digests of all pending entries.
+
+        If sending one fails, it and those not sent yet are kept
+        for the next flush."""
+        with self.lock:
+            entries, self.pending = self.pending, []
+            digests, self.unsent = self.unsent, []
+            if entries and self.digest == "recipient":
+                digests.extend((entries, [to]) for to in self.to)
+            elif entries:
+                cases = OrderedDict()
+                for e in entries:
+                    cases.setdefault((e.court, e.case), []).append(e)
+                digests.extend((case_entries, self.to)
+                               for case_entries in cases.values())
+            for i, (digest_entries, to) in enumerate(digests):
+                try:
+                    self._send(self.message(digest_entries), to)
+                except BaseException:
+                    self.unsent = digests[i:]
+                    raise
+
+    def close(self):
+        """Send anything pending and end the session."""
+        self.flush()
+        with self.lock:
+            if self.smtp is not None:
+                import smtplib
+                try:
+                    self.smtp.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+                self.smtp = None
+
+# (account, to) -> EmailNotifier used by send_email
+email_sessions = {}
+
 def send_email(entry, email_account, email_pass, email_to):
     """Send an email containing `entry`.
     Note: currently only works on Gmail.
 
-    **Not tested**
+    Sessions are reused between calls; see EmailNotifier.
     """
-
-    s = smtplib.SMTP()
-    s.connect("smtp.gmail.com", 587)
-    s.starttls()
-    s.login(email_account, email_pass)
-
-    message = MIMEText(str(entry))
-    message['Subject'] = "New PACER entry in {}".format(entry.case_name)
-    message['From'] = "pacerrssscraper"
-    s.send_message(message, from_addr=email_account, to_addrs=email_to)
-    s.quit()
+    key = (email_account, email_to)
+    if key not in email_sessions:
+        email_sessions[key] = EmailNotifier(email_account, email_pass,
+                                            email_to)
+    email_sessions[key](entry)
+
+class RecapResolver:
+    """A notifier checking whether the RECAP links of entries (see
+    RSSEntry.recap_links) are really there, which sets their `recap`
+    accordingly before passing them on to `notifier`.
+
+    Entries are held until flush(), which scrape() calls once per
+    scrape, and the links of all of them are then checked at once:
+    HEAD requests, `workers` at a time, over `connections` (a
+    ConnectionPool). Answers are cached, for `ttl` if the link was
+    there and for `negative_ttl` if it wasn't, so a case with many
+    entries is only looked up once. At most `cache_size` are kept.
+    Links which couldn't be checked (say, archive.org is down) count
+    as missing, but aren't cached.
+
+    Documents which weren't on RECAP yet are checked again at later
+    flushes, once their answer has expired, for up to `recheck`;
+    those which turn up are passed to `uploaded` (another notifier).
+    Without `uploaded`, they aren't kept track of. The command line
+    (--recap) doesn't pass one, since none of its notifiers has a way
+    to update an entry already reported: there, each entry's links are
+    checked just once, and rechecking is only for library use.
+
+    A failure to check the links, or to pass on one entry, is logged
+    and doesn't keep the other entries from being passed on. With
+    `background`, flush() returns at once and all this is done in a
+    thread of its own, so as not to delay polling.
+
+    `url` is where to look instead of RECAP_URL (e.g. a stand-in);
+    `clock` gives the current time as an offset-aware datetime.
+    """
+    def __init__(self, notifier, uploaded=None, connections=None,
+                 workers=8, ttl=timedelta(days=1),
+                 negative_ttl=timedelta(hours=1), recheck=timedelta(days=2),
+                 cache_size=10000, url=RECAP_URL, clock=dtnow,
+                 background=False):
+        self.notifier = notifier
+        self.uploaded = uploaded
+        self.connections = connections or ConnectionPool()
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="recap")
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.recheck = recheck
+        self.cache_size = cache_size
+        self.url = url
+        self.clock = clock
+        # link --> (whether it is there, until when that holds),
+        # least recently checked first
+        self.cache = OrderedDict()
+        # entries held until flush()
+        self.pending = []
+        # lref --> (entry whose document is missing, when to give up)
+        self.missing = OrderedDict()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flusher = None
+        if background:
+            self.flusher = ThreadPoolExecutor(
+                1, thread_name_prefix="recap-flush")
+
+    def _exists(self, link):
+        """Whether `link` is there: True or False, or None if that
+        couldn't be found out."""
+        target = self.url + link[len(RECAP_URL):]
+        headers = {"User-Agent": USER_AGENT}
+        try:
+            # downloads are redirected to the server holding the file
+            for _ in range(5):
+                with self.connections.get(target, headers,
+                                          "HEAD") as response:
+                    location = response.headers.get("Location")
+                    if (response.status in (301, 302, 303, 307, 308)
+                            and location):
+                        target = urljoin(target, location)
+                        continue
+                    if response.status in (404, 410):
+                        return False
+                    if response.status == 200:
+                        return True
+                    log.warning("Couldn't check {}: {} {}".format(
+                        link, response.status, response.reason))
+                    return None
+            log.warning("Couldn't check {}: too many redirects".format(link))
+        except (socket.timeout, URLError) as e:
+            log.warning("Couldn't check {}: {}".format(link, e))
+        return None
+
+    def _cached(self, link, now):
+        """The cached answer for `link`, or None if there is none."""
+        with self.lock:
+            found, until = self.cache.get(link, (None, now))
+        return found if until > now else None
+
+    def _check(self, links, answers, now):
+        """Add whether each of `links` is there to `answers`, checking
+        those which aren't cached all at once."""
+        unknown = []
+        for link in links:
+            if link not in answers:
+                answers[link] = self._cached(link, now)
+                if answers[link] is None:
+                    unknown.append(link)
+        for link, found in zip(unknown, self.pool.map(self._exists, unknown)):
+            answers[link] = found
+            if found is None:
+                continue
+            with self.lock:
+                self.cache.pop(link, None)
+                self.cache[link] = (found, now + (self.ttl if found else
+                                                  self.negative_ttl))
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+    def resolve(self, entries):
+        """Set `recap` on each of `entries`, checking all the links
+        which aren't cached at once."""
+        now = self.clock()
+        answers = {}
+        # A document can only be there if its case is. Unnumbered
+        # entries have no document link (see RSSEntry).
+        self._check([e.recap_links[0] for e in entries], answers, now)
+        self._check([e.recap_links[1] for e in entries
+                     if e.number and answers[e.recap_links[0]]],
+                    answers, now)
+        for entry in entries:
+            case, doc = entry.recap_links
+            entry.recap = (case if answers[case] else None,
+                           doc if answers.get(doc) else None)
+
+    def __call__(self, entry):
+        with self.lock:
+            self.pending.append(entry)
+
+    def flush(self):
+        """Check the links of the entries held since the last flush and
+        pass them on, along with any missing documents that are due to
+        be checked again."""
+        if self.flusher:
+            self.flusher.submit(self._flush)
+        else:
+            self._flush()
+
+    def _flush(self):
+        """Do what flush() does, here and now."""
+        with self.flush_lock:
+            with self.lock:
+                entries, self.pending = self.pending, []
+            now = self.clock()
+            for lref, (entry, until) in list(self.missing.items()):
+                if until <= now:
+                    del self.missing[lref]
+            recheck = [entry for entry, until in self.missing.values()
+                       if self._cached(entry.recap_links[1], now) is None]
+            if not entries and not recheck:
+                return
+            try:
+                self.resolve(entries + recheck)
+            except Exception:
+                # pass the entries on anyway, as if nothing were there
+                log.exception("Couldn't check RECAP links.")
+                recheck = []
+
+            for entry in recheck:
+                if entry.recap[1]:
+                    log.info("{} is on RECAP now.".format(entry.lref))
+                    del self.missing[entry.lref]
+                    try:
+                        self.uploaded(entry)
+                    except Exception:
+                        log.exception(entry)
+            for entry in entries:
+                if (self.uploaded and entry.number and entry.recap
+                        and not entry.recap[1]):
+                    self.missing[entry.lref] = (entry, now + self.recheck)
+                    while len(self.missing) > self.cache_size:
+                        self.missing.popitem(last=False)
+                try:
+                    self.notifier(entry)
+                except Exception:
+                    log.exception(entry)
+            if hasattr(self.notifier, 'flush'):
+                try:
+                    self.notifier.flush()
+                except Exception:
+                    log.exception("flushing {}".format(self.notifier))
+
+    def join(self):
+        """Wait until everything flushed so far has been passed on."""
+        if self.flusher:
+            self.flusher.submit(lambda: None).result()
+
+    def close(self):
+        """Pass on anything pending, and close `notifier`."""
+        self.flush()
+        if self.flusher:
+            self.flusher.shutdown()
+        self.pool.shutdown()
+        self.connections.close()
+        if hasattr(self.notifier, 'close'):
+            self.notifier.close()
 
 def make_notifier(*args, **kwargs):
     """Make a notifier function with access to credentials, etc.
@@ -447,6 +2450,337 @@ def make_notifier(*args, **kwargs):
 
     return notify
 
+def combine_notifiers(*notifiers):
+    """Make a notifier passing each entry to all of `notifiers`.
+
+    An exception from one of them doesn't stop the others.
+    Its flush() flushes all of them that have one.
+    """
+    def notify(entry):
+        """Pass `entry` to every notifier."""
+        for n in notifiers:
+            try:
+                n(entry)
+            except Exception:
+                log.exception(entry)
+
+    def flush():
+        """Flush every notifier that has a flush()."""
+        for n in notifiers:
+            if hasattr(n, 'flush'):
+                try:
+                    n.flush()
+                except Exception:
+                    log.exception("flushing {}".format(n))
+
+    def close():
+        """Close every notifier that has a close()."""
+        for n in notifiers:
+            if hasattr(n, 'close'):
+                try:
+                    n.close()
+                except Exception:
+                    log.exception("closing {}".format(n))
+
+    notify.flush = flush
+    notify.close = close
+    return notify
+
+class DispatchQueue:
+    """Deliver notifications in the background, so that slow notifiers
+    don't hold up scraping.
+
+    `lanes` maps names to notifiers, and each gets its own lane: a queue
+    of at most `maxsize` entries drained by `workers` threads. Calling
+    this object (it is itself a notifier) queues the entry in every
+    lane, blocking while any of them is full.
+
+    A failed notification is retried up to `retries` times, waiting
+    `retry_delay` seconds the first time and twice as long each time
+    after, give or take 50% so that retries don't all come at once.
+
+    Entries are written to the SQLite spool file `spool` before being
+    queued, and only deleted once delivered (or given up on). Whatever
+    is still in the spool when this is created, say because the last
+    process was killed, is delivered again.
+
+    Notifiers with a flush() (like SQLiteSink) are flushed whenever their
+    lane runs dry, and only then are their entries taken off the spool.
+    """
+    def __init__(self, lanes, spool, maxsize=100, workers=1,
+                 retries=5, retry_delay=2.0):
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.stopping = threading.Event()
+
+        self.spool = sqlite3.connect(spool, check_same_thread=False)
+        self.spool_lock = threading.Lock()
+        with self.spool:
+            self.spool.execute("""CREATE TABLE IF NOT EXISTS spool
+                                  (id INTEGER PRIMARY KEY, lane TEXT,
+                                   entry TEXT)""")
+
+        self.lanes = OrderedDict()
+        self.threads = []
+        for name, notifier in lanes.items():
+            q = queue.Queue(maxsize)
+            self.lanes[name] = q
+            for i in range(workers):
+                t = threading.Thread(target=self._work,
+                                     args=(name, notifier, q),
+                                     name="{}-{}".format(name, i),
+                                     daemon=True)
+                t.start()
+                self.threads.append(t)
+
+        # Requeue whatever didn't get delivered last time.
+        with self.spool_lock:
+            spooled = self.spool.execute(
+                "SELECT id, lane, entry FROM spool ORDER BY id").fetchall()
+        for spool_id, name, entry in spooled:
+            if name in self.lanes:
+                log.info("Requeueing spooled {} notification {}.".format(
+                    name, spool_id))
+                self.lanes[name].put(
+                    (spool_id, RSSEntry.from_dict(json.loads(entry))))
+
+    def __call__(self, entry):
+        data = json.dumps(entry.to_dict())
+        for name, q in self.lanes.items():
+            with self.spool_lock, self.spool:
+                spool_id = self.spool.execute(
+                    "INSERT INTO spool (lane, entry) VALUES (?, ?)",
+                    (name, data)).lastrowid
+            q.put((spool_id, entry))
+
+    def _unspool(self, spool_ids):
+        with self.spool_lock, self.spool:
+            self.spool.executemany("DELETE FROM spool WHERE id = ?",
+                                   [(i,) for i in spool_ids])
+
+    def _deliver(self, name, f, *args):
+        """Call f(*args), retrying on failure.
+
+        Returns True if it succeeded, False if we gave up,
+        and None if we are shutting down.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                f(*args)
+                return True
+            except Exception:
+                if attempt == self.retries:
+                    log.exception("{} notification failed; giving up.".format(
+                        name))
+                    return False
+                delay = (self.retry_delay * 2**attempt *
+                         random.uniform(0.5, 1.5))
+                log.warning("{} notification failed; retrying in "
+                            "{:.1f}s.".format(name, delay), exc_info=True)
+                if self.stopping.wait(delay):
+                    return None
+
+    def _work(self, name, notifier, q):
+        """Worker thread for the lane `name`."""
+        # entries delivered, but not yet flushed
+        unflushed = []
+        while not self.stopping.is_set():
+            try:
+                spool_id, entry = q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                if self._deliver(name, notifier, entry) is None:
+                    return
+                unflushed.append(spool_id)
+                if not hasattr(notifier, 'flush'):
+                    self._unspool(unflushed)
+                    unflushed = []
+                elif q.empty():
+                    flushed = self._deliver(name, notifier.flush)
+                    if flushed is None:
+                        return
+                    # If we gave up, the notifier still holds them
+                    # (and the spool too, in case we are killed).
+                    if flushed:
+                        self._unspool(unflushed)
+                        unflushed = []
+            finally:
+                q.task_done()
+
+    def join(self):
+        """Wait until everything queued so far has been delivered."""
+        for q in self.lanes.values():
+            q.join()
+
+    def close(self, timeout=5):
+        """Stop delivering notifications.
+
+        Anything not yet delivered stays in the spool for next time.
+        """
+        self.stopping.set()
+        for t in self.threads:
+            t.join(timeout)
+        with self.spool_lock:
+            self.spool.close()
+
+class EntryStream:
+    """A notifier publishing entries to any number of subscribers,
+    as Server-Sent Events over HTTP (see serve()).
+
+    Each entry is numbered and serialized to JSON once, and kept in a
+    ring of the last `history` entries, which each subscriber reads
+    from at its own pace. Publishing never waits for a subscriber: one
+    which falls more than `history` entries behind misses some, and is
+    told how many. A subscriber can resume from the number of the last
+    entry it got. Numbering starts from the time the stream was made,
+    in milliseconds, so numbers keep going up across restarts.
+    """
+    def __init__(self, history=10000, heartbeat=15):
+        self.entries = deque(maxlen=history)
+        # (number, court) of the `history` entries before those, so
+        # that subscribers to some courts are told how many of theirs
+        # they missed
+        self.gone = deque(maxlen=history)
+        self.heartbeat = heartbeat
+        self.seq = self.start = int(dtnow().timestamp() * 1000)
+        self.cond = threading.Condition()
+        self.closed = False
+        self.subscribers = 0
+
+    @staticmethod
+    def event(entry):
+        """What subscribers get for `entry`."""
+        return {'court': entry.court,
+                'case': entry.case,
+                'case_name': entry.case_name,
+                'number': entry.number,
+                'title': entry.title,
+                'time_filed': entry.time_filed.isoformat(),
+                'lref': entry.lref,
+                'link': entry.link,
+                'docket_link': entry.docket_link,
+                'matched': list(entry.matched)}
+
+    def __call__(self, entry):
+        data = json.dumps(self.event(entry), sort_keys=True)
+        with self.cond:
+            self.seq += 1
+            if len(self.entries) == self.entries.maxlen:
+                self.gone.append(self.entries[0][:2])
+            self.entries.append((self.seq, entry.court, data))
+            self.cond.notify_all()
+
+    def read(self, after, timeout=None, courts=None):
+        """Wait up to `timeout` seconds for entries numbered after
+        `after`. Returns (missed, entries): how many of those are no
+        longer kept, and a list of (number, court, JSON) of the rest.
+
+        If `courts` is given, only the entries of those courts are
+        counted as missed. Either way, this is as far as is known:
+        entries from before the stream was made aren't counted, nor,
+        with `courts`, those more than twice `history` ago."""
+        with self.cond:
+            if self.seq <= after and not self.closed:
+                self.cond.wait(timeout)
+            if not self.entries or self.seq <= after:
+                return 0, []
+            first = self.entries[0][0]
+            start = max(after + 1, first)
+            missed = start - max(after, self.start) - 1
+            if missed and courts:
+                gone = islice(self.gone,
+                              bisect_left(self.gone, (after + 1,)), None)
+                missed = sum(1 for seq, court in gone if court in courts)
+            return (missed,
+                    [self.entries[i]
+                     for i in range(start - first, len(self.entries))])
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve the stream at /events from a background thread, on
+        `host` (by default, only to this machine).
+
+        Query parameters: `court` (may be repeated) only sends the
+        entries of those courts, and `since` resumes after an entry
+        number, as does the Last-Event-ID header which EventSource
+        clients send when they reconnect. Without either, only new
+        entries are sent.
+
+        Returns the server; call shutdown() on it to stop.
+        """
+        server = StreamServer((host, port), StreamHandler)
+        server.stream = self
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def close(self):
+        """End every subscription."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+class StreamServer(socketserver.ThreadingMixIn, HTTPServer):
+    """HTTP server for EntryStream.serve()."""
+    daemon_threads = True
+
+class StreamHandler(BaseHTTPRequestHandler):
+    """Sends a subscriber entries from an EntryStream as they come."""
+    # A subscriber which doesn't read for this long is dropped,
+    # rather than keeping a thread blocked on it forever.
+    timeout = 60
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        stream = self.server.stream
+        parts = urlsplit(self.path)
+        if parts.path != "/events":
+            self.send_error(404)
+            return
+        query = parse_qs(parts.query)
+        courts = set(query.get('court', ()))
+        after = self.headers.get("Last-Event-ID") or \
+            query.get('since', [None])[0]
+        try:
+            after = min(int(after), stream.seq) if after else stream.seq
+        except ValueError:
+            self.send_error(400, "Bad entry number")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        with stream.cond:
+            stream.subscribers += 1
+        try:
+            # tell EventSource clients to reconnect soon if cut off
+            self.wfile.write(b"retry: 1000\n\n")
+            self.wfile.flush()
+            while not stream.closed:
+                missed, entries = stream.read(after, stream.heartbeat,
+                                              courts)
+                chunks = []
+                if missed:
+                    chunks.append("event: missed\ndata: {}\n\n".format(
+                        missed))
+                for seq, court, data in entries:
+                    if not courts or court in courts:
+                        chunks.append("id: {}\ndata: {}\n\n".format(
+                            seq, data))
+                    after = seq
+                # an empty comment keeps the connection alive and lets
+                # us notice when the subscriber is gone
+                self.wfile.write(("".join(chunks) or ":\n\n")
+                                 .encode("utf-8"))
+                self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            with stream.cond:
+                stream.subscribers -= 1
+
 def read_cases(filename):
     """Read in a list of cases (PACER numbers) and aliases for them.
 
@@ -484,7 +2818,20 @@ def read_cases(filename):
 
 def list_filter(cases, aliases):
     """The scrape filter corresponding to read_cases.
+
+    The filter has a `prefilter` (see scrape) which rejects raw entries
+    whose PACER number is not on the list in any court, so most entries
+    never become RSSEntry objects.
     """
+    numbers = set()
+    for nums in cases.values():
+        numbers.update(nums)
+
+    def prefilter(entry):
+        """Return False for raw entries which cannot match `cases`."""
+        match = RSSEntry.p_pacer_num.search(entry['link'])
+        return (int(match.group(1)) if match else 0) in numbers
+
     def entry_filter(entry):
         """
         Return True for entries matching a case in `cases`,
@@ -500,144 +2847,434 @@ def list_filter(cases, aliases):
         else:
             return False
 
+    entry_filter.prefilter = prefilter
     return entry_filter
 
+def read_keywords(filename):
+    """Read in a list of keywords, like
+    ["Prenda", "Ingenuity 13", "Motion for Sanctions"].
 
-if __name__ == '__main__':
-    # get command-line arguments
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--case-list", action='store')
-    parser.add_argument("--log", action='store')
-    parser.add_argument("--verbose", "-v", action='count', default=0)
-    parser.add_argument("--email", action='store_true')
-    parser.add_argument("--twitter", action='store_true')
-    for arg in ["--e-from", "--e-pass", "--e-to",
-                "--t-oauth-token", "--t-oauth-secret",
-                "--t-consumer-key", "--t-consumer-secret"]:
-        parser.add_argument(arg, action='store', default="")
-    args = parser.parse_args()
-
-    case_list = args.case_list
-    log_location = args.log
-    verbosity = min(3, args.verbose) # verbosity breaks after -vvv
-
-    notifier = make_notifier(
-        twitter={
-            'oauth_token': args.t_oauth_token,
-            'oauth_secret': args.t_oauth_secret,
-            'consumer_key': args.t_consumer_key,
-            'consumer_secret': args.t_consumer_secret
-        },
-        email={
-            'from': args.e_from,
-            'to': args.e_to,
-            'pass': args.e_pass}
-    )
-
-    # set up a logger (separate from notifier)
-    log = logging.getLogger("pacerrssscraper-"+VERSION)
-    log.setLevel(logging.DEBUG)
-
-    log_format = logging.Formatter(
-        fmt="[{asctime}] *"+VERSION+"* {levelname}: {message}",
-        datefmt="%a %b %d %X %Y UTC", style="{")
-    # use UTC time instead of local time since
-    # the RSS feeds' times are given in UTC
-    log_format.converter = gmtime
-
-    log_stdout = logging.StreamHandler()
-    log_stdout.setLevel(logging.ERROR - 10*verbosity)
-    log_stdout.setFormatter(log_format)
-    log.addHandler(log_stdout)
-
-    if log_location:
-        # WatchedFileHandler allows for the log file
-        # to be modified or even moved underneath us.
-        log_file = logging.handlers.WatchedFileHandler(log_location)
-        log_file.setLevel(logging.ERROR - 10*verbosity)
-        log_file.setFormatter(log_format)
-        log.addHandler(log_file)
-
-
-    # set up a SIGTERM/SIGINT handler so that this process
-    # can be killed with Ctrl+C or kill(1).
-    def cb_quit(signal, frame):
-        """Quit with a message and exit code 0."""
-        log.critical("Received SIGTERM. Quitting.\n--------------------\n")
-        sys.exit(0)
-    signal.signal(signal.SIGTERM, cb_quit)
-    signal.signal(signal.SIGINT, cb_quit)
+    See: keyword_filter
+    """
+    with open(filename, 'r') as f:
+        keywords = json.load(f)
+    if not all(isinstance(k, str) for k in keywords):
+        raise ValueError("{} is not a list of strings".format(filename))
+    return keywords
+
+def trie_pattern(words):
+    """A regular expression matching any of `words`.
+
+    The words are merged into a trie, so the regular expression engine
+    only ever follows one branch of it from each position in the text:
+    matching takes time proportional to the length of the text (times
+    that of the longest word at most), however many words there are.
+    At each position the longest word is matched.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def pattern(node):
+        branches = [re.escape(char) + pattern(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        optional = "?" if "" in node else ""
+        return "(?:" + "|".join(branches) + ")" + optional
+
+    return pattern(trie)
+
+def keyword_filter(keywords):
+    """A scrape filter for entries with any of `keywords` in their
+    title or case name, as whole words, ignoring case.
+
+    The keywords that were found are put in the `matched` attribute
+    of the entry. Overlapping keywords are only found once: in
+    "Prenda Law", "Prenda Law" is found but "Law" is not.
+    """
+    # lower case --> as given
+    canonical = {k.lower(): k for k in keywords if k.strip()}
+    if not canonical:
+        return lambda entry: False
+    # Not \b, which needs a word character on the inside: keywords
+    # like "U.S." or "Apple Inc." begin or end with punctuation.
+    p_keywords = re.compile(
+        r"(?<!\w)" + trie_pattern(canonical) + r"(?!\w)", re.IGNORECASE)
 
-    # Override sys.excepthook
-    def exception_handler(exc_type, value, tb):
-        log.error(*traceback.format_exception(exc_type, value, tb))
-    sys.excepthook = exception_handler
+    def entry_filter(entry):
+        """
+        Return True for entries mentioning any of `keywords`,
+        and set their `matched` attribute to those keywords.
+        """
+        found = set(p_keywords.findall(entry.title))
+        found.update(p_keywords.findall(entry.case_name))
+        if not found:
+            return False
+        entry.matched = tuple(sorted({canonical[k.lower()] for k in found}))
+        return True
 
-    # ------------------------------
+    return entry_filter
 
-    log.critical("Starting...")
-    log.critical("We are process {}".format(os.getpid()))
+def any_filter(*filters):
+    """A scrape filter for entries passing any of `filters`.
 
-    RSS_COURTS = ["almd", "alsd", "akd", "ared", "arwd", "cacd",
-                  "cand", "casd", "ctd", "ded", "dcd", "flmd",
-                  "flsd", "gamd", "gud", "idd", "ilcd", "ilnd",
-                  "innd", "insd", "iand", "iasd", "ksd", "kywd", "laed",
-                  "lamd", "lawd", "mad", "mied", "miwd", "moed",
-                  "mowd", "mtd", "ned", "nhd", "njd", "nyed",
-                  "nynd", "nysd", "nced", "ncmd", "ncwd", "nmid",
-                  "ohnd", "ohsd", "okwd", "ord", "paed", "pamd", "pawd",
-                  "prd", "rid", "sdd", "tned", "tnmd", "txed",
-                  "txsd", "txwd", "utd", "vtd", "vid", "vawd",
-                  "waed", "wawd", "wied", "wiwd", "wvnd", "wvsd", "wyd"]
-
-    # Time to wait between checks of a given court.
-    # This could probably be tuned somewhat.
-    SCRAPE_INTERVAL = timedelta(minutes=35)
-
-    # Time to wait between checks.
-    # Setting this too low may make the PACER people mad.
-    # Setting this too high makes reporting bursty.
-    CHECK_INTERVAL = timedelta(minutes=5)
+    Every filter is given every entry, in order, so all of them can
+    change the entries they pass (as list_filter and keyword_filter do).
+    """
+    def entry_filter(entry):
+        """Return True for entries passing any of `filters`."""
+        results = [f(entry) for f in filters]
+        return any(results)
+
+    prefilters = [getattr(f, 'prefilter', None) for f in filters]
+    if filters and None not in prefilters:
+        entry_filter.prefilter = lambda entry: any(
+            p(entry) for p in prefilters)
+    return entry_filter
 
-    # Table for exponential backoff in case of timeouts
-    #
-    # Sometimes courts go down for extended periods of time
-    # (up to several days). We don't want to clobber them
-    # every CHECK_INTERVAL in such cases.
-    backoff = defaultdict(lambda: 1)
+class Watchlist:
+    """The case list in a file (see read_cases), and its filter.
 
+    reload() only re-reads the file if it has been modified or replaced
+    since it was last read, so it is cheap to call before every check.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.stamp = None
+        self.load(None)
+
+    def load(self, filename):
+        """Read `filename`, or start out empty if it is None, and
+        set `cases` (see read_cases) and `filter`."""
+        self.cases, self.aliases = read_cases(filename) if filename \
+            else ({}, {})
+        self.filter = list_filter(self.cases, self.aliases)
+
+    def reload(self):
+        """Re-read the case list if the file has changed.
+
+        Returns whether it was re-read. A file which can't be parsed
+        is logged and treated as an empty list until it changes again.
+        """
+        st = os.stat(self.filename)
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp == self.stamp:
+            return False
 
-    # court -> datetime
-    last_updated = {}
-    next_check = {}
+        try:
+            self.load(self.filename)
+        except ValueError:
+            log.exception("")
+            self.load(None)
+        self.stamp = stamp
+        log.info("Loaded {}.".format(self.filename))
+        return True
+
+class KeywordWatchlist(Watchlist):
+    """The keywords in a file (see read_keywords), and their filter
+    (see keyword_filter), reloaded like a Watchlist.
+
+    Keywords are looked for in every court in RSS_COURTS.
+    """
+    def load(self, filename):
+        self.keywords = read_keywords(filename) if filename else []
+        self.cases = {court: set() for court in RSS_COURTS} \
+            if self.keywords else {}
+        self.filter = keyword_filter(self.keywords)
+
+class Subscriptions:
+    """The case lists of any number of subscribers, each with its own
+    notifier, all watched by one Scraper: this is both a watchlist to
+    run it with (like Watchlist) and the notifier to give it.
+
+    An inverted index maps each (court, PACER number) to the
+    subscribers watching that case, and the alias each of them gave it
+    (as in read_cases). `filter` passes the entries of the cases anyone
+    watches, so each feed is still only fetched and parsed once, and
+    calling this object with an entry passes it on to the notifier of
+    each subscriber watching its case, with their alias as its case
+    name. Either takes one lookup, plus one call per subscriber for
+    the latter, however many subscribers there are.
+
+    Subscribers may come and go at any time, even while scraping.
+    """
+    def __init__(self):
+        # (court, number) --> {subscriber: alias}
+        self.index = {}
+        # subscriber --> (notifier, [(court, number), ...])
+        self.subscribers = {}
+        # PACER number --> in how many courts it is watched
+        self.numbers = defaultdict(int)
+        # subscribers notified since the last flush()
+        self.unflushed = set()
+        self.lock = threading.Lock()
+
+        index, numbers = self.index, self.numbers
+
+        def prefilter(entry):
+            """Return False for raw entries of cases nobody watches."""
+            match = RSSEntry.p_pacer_num.search(entry['link'])
+            return (int(match.group(1)) if match else 0) in numbers
+
+        def entry_filter(entry):
+            """Return True for entries of cases somebody watches."""
+            return (entry.court, int(entry.pacer_num)) in index
+
+        entry_filter.prefilter = prefilter
+        self.filter = entry_filter
+
+    def _remove(self, name):
+        _, keys = self.subscribers.pop(name, (None, ()))
+        for key in keys:
+            watchers = self.index[key]
+            del watchers[name]
+            if not watchers:
+                del self.index[key]
+                self.numbers[key[1]] -= 1
+                if not self.numbers[key[1]]:
+                    del self.numbers[key[1]]
+
+    def subscribe(self, name, notifier, cases, aliases=None):
+        """Pass the entries of `cases` (court --> set of PACER numbers)
+        to `notifier`, under the case names in `aliases` ((court,
+        number) --> name), as read_cases() returns them. This replaces
+        whatever `name` was subscribed to before."""
+        aliases = aliases or {}
+        keys = list(OrderedDict.fromkeys(
+            (court, int(number))
+            for court, numbers in cases.items() for number in numbers))
+        with self.lock:
+            self._remove(name)
+            for key in keys:
+                if key not in self.index:
+                    self.numbers[key[1]] += 1
+                    self.index[key] = {}
+                self.index[key][name] = aliases.get(key)
+            self.subscribers[name] = (notifier, keys)
+
+    def unsubscribe(self, name):
+        """Stop passing entries to `name`."""
+        with self.lock:
+            self._remove(name)
+            self.unflushed.discard(name)
 
-    #
-    # Main loop
-    #
-    while True:
-        # Load case and court information from database
-        if case_list:
+    @property
+    def cases(self):
+        """court --> set of the PACER numbers anyone watches there."""
+        with self.lock:
+            keys = list(self.index)
+        cases = {}
+        for court, number in keys:
+            cases.setdefault(court, set()).add(number)
+        return cases
+
+    def reload(self):
+        """Like Watchlist.reload(), but there is never anything to
+        re-read: subscribe() takes effect right away."""
+        return False
+
+    def __call__(self, entry):
+        watchers = self.index.get((entry.court, int(entry.pacer_num)))
+        if not watchers:
+            return
+        # copied in one go, in case somebody subscribes meanwhile
+        for name, alias in list(watchers.items()):
+            notifier, _ = self.subscribers.get(name, (None, None))
+            if notifier is None:
+                continue
+            routed = entry
+            if alias:
+                routed = entry.copy()
+                routed.case_name = alias
             try:
-                cases, aliases = read_cases(case_list)
-            except ValueError:
-                log.exception("")
-                cases, aliases = {}, {}
-        else:
-            cases, aliases = {}, {}
-
-        # The default filter uses the provided case list,
-        # unless one wasn't provided, in which case it
-        # uses an empty case list.
-        default_filter = list_filter(cases, aliases)
-
-        # This adds *all* RSS-enabled courts to the list of courts
-        # to watch. You should ****REPLACE THIS****
-        #for court in RSS_COURTS:
-        #    if court not in cases:
-        #        cases[court] = set()
+                notifier(routed)
+            except Exception:
+                log.exception("notifying {}".format(name))
+            with self.lock:
+                self.unflushed.add(name)
+
+    def flush(self):
+        """Flush the notifiers (those with a flush()) of the subscribers
+        notified since the last flush."""
+        with self.lock:
+            names, self.unflushed = self.unflushed, set()
+            notifiers = [self.subscribers[name][0] for name in names
+                         if name in self.subscribers]
+        for n in notifiers:
+            if hasattr(n, 'flush'):
+                try:
+                    n.flush()
+                except Exception:
+                    log.exception("flushing {}".format(n))
+
+    def close(self):
+        """Close every subscriber's notifier that has a close()."""
+        self.flush()
+        with self.lock:
+            notifiers = [n for n, _ in self.subscribers.values()]
+        for n in notifiers:
+            if hasattr(n, 'close'):
+                try:
+                    n.close()
+                except Exception:
+                    log.exception("closing {}".format(n))
+
+class Scraper:
+    """The main loop, and what it keeps track of for each court.
+
+    - notifier:   called with each RSSEntry to report (see scrape)
+    - fetcher:    the FeedFetcher to fetch feeds with
+    - next_check: the Scheduler deciding when to check each court
+    - store:      a StateStore to checkpoint to, if any
+                  Whatever was saved in it is restored first.
+    - seen:       a SeenStore of entries already reported, if any
+    - metrics:    a Metrics to record what happens in, if any
+    - shard:      a Shard, if the courts are divided between several
+                  instances, each only checking the ones it holds.
+                  Courts are restored from `store` when taken over.
+    - breaker:    the CircuitBreaker deciding when to check courts
+                  which fail to be checked
+    - clock, sleep: the current time as an offset-aware datetime, and
+                  how to wait some seconds (see standins.SimulatedClock)
+    """
+    # Longest time to wait between checks, so that changes to the
+    # case list are picked up. Also the default base of the backoff
+    # of failing courts.
+    CHECK_INTERVAL = timedelta(minutes=5)
 
-        # Add courts to last_updated and next_check if necessary.
-        for court in cases.keys() - next_check.keys():
+    def __init__(self, notifier, fetcher=None, next_check=None, store=None,
+                 seen=None, metrics=None, shard=None, breaker=None,
+                 clock=dtnow, sleep=sleep):
+        self.notifier = notifier
+        self.fetcher = fetcher or FeedFetcher()
+        self.next_check = Scheduler() if next_check is None else next_check
+        self.store = store
+        self.seen = seen
+        self.metrics = metrics
+        if metrics:
+            metrics.collectors.append(self.collect)
+        self.shard = shard
+        self.clock = clock
+        self.sleep = sleep
+
+        # Sometimes courts go down for extended periods of time
+        # (up to several days). We don't want to clobber them
+        # every CHECK_INTERVAL in such cases, but we do want to
+        # notice soon once they are back.
+        self.breaker = breaker or CircuitBreaker(self.CHECK_INTERVAL)
+
+        # court -> datetime
+        self.last_updated = {}
+
+        # court -> HTTP validators of its feed (see feed_validators)
+        self.validators = {}
+
+        # courts whose checkpoint failed, to be saved next cycle
+        self.unsaved = set()
+
+        # Pick up where the last run left off. Courts restored
+        # here won't be probed again by add_courts().
+        # (Sharded instances only restore the courts they hold.)
+        if not shard:
+            self.restore()
+
+    def restore(self, courts=None):
+        """Restore the state of `courts` (by default, all of them)
+        from the store, if it has any."""
+        if not self.store:
+            return
+        wanted = lambda court: courts is None or court in courts
+        for court, validators in self.store.load_validators().items():
+            if wanted(court):
+                self.validators[court] = validators
+        for court, builds in self.store.load_builds().items():
+            if wanted(court):
+                self.next_check.builds[court].clear()
+                self.next_check.builds[court].extend(builds)
+        for court, state in self.store.load_schedule().items():
+            if wanted(court):
+                (self.last_updated[court], self.next_check[court],
+                 self.breaker.failures[court]) = state
+                self.breaker.retry[court] = self.next_check[court]
+                log.info("Restored {}; next check at {}.".format(
+                    court, dtfmt(self.next_check[court])))
+
+    def drop(self, court):
+        """Stop checking `court`. Its state stays in the store."""
+        log.info("Dropping {}.".format(court))
+        del self.next_check[court]
+        self.next_check.builds.pop(court, None)
+        for table in (self.last_updated, self.validators):
+            table.pop(court, None)
+        self.breaker.forget(court)
+        self.unsaved.discard(court)
+
+    def collect(self, metrics):
+        """Set the gauges of every court in `metrics`."""
+        now = self.clock()
+        for court, when in list(self.next_check.items()):
+            metrics.set("pacer_next_check_lag_seconds",
+                        (now - when).total_seconds(), court=court)
+            metrics.set("pacer_failures", self.breaker.failures[court],
+                        court=court)
+            metrics.set("pacer_circuit_open",
+                        int(self.breaker.state(court, now) != "closed"),
+                        court=court)
+        for court, recovery in self.breaker.recovery.items():
+            metrics.set("pacer_recovery_seconds", recovery.total_seconds(),
+                        court=court)
+
+    def error(self, court, kind):
+        """Count a failed check of `court`."""
+        if self.metrics:
+            self.metrics.inc("pacer_fetch_errors_total", court=court,
+                             error=kind)
+
+    def back_off(self, court):
+        """Leave `court`, which couldn't be checked, alone for a while
+        (see CircuitBreaker)."""
+        self.next_check[court] = self.breaker.failure(
+            court, max(self.next_check[court], self.clock()))
+        if self.breaker.failures[court] == self.breaker.threshold:
+            log.warning("Leaving {} alone for now.".format(court))
+        self.checkpoint(court)
+
+    def remember_validators(self, court, feed):
+        """Keep the validators of a successfully processed feed."""
+        self.validators[court] = feed_validators(
+            feed, self.validators.get(court))
+
+    def checkpoint(self, court):
+        """Save the state of `court` so it survives a restart.
+
+        If the store can't be written to (say, another instance has
+        it locked), that is logged, and tried again next cycle."""
+        if not self.store:
+            return
+        try:
+            self.store.checkpoint(court, self.last_updated[court],
+                                  self.next_check[court],
+                                  self.breaker.failures[court],
+                                  self.validators.get(court),
+                                  self.next_check.builds.get(court))
+            self.unsaved.discard(court)
+        except sqlite3.Error:
+            log.exception("Couldn't checkpoint {}.".format(court))
+            self.unsaved.add(court)
+
+    def add_courts(self, courts):
+        """Start watching `courts`, which aren't being watched yet,
+        by finding out when each was last updated."""
+        # we only need to read up to the first entry of each
+        probes = self.fetcher.fetch(courts, self.validators,
+                                    dict.fromkeys(courts, self.clock()))
+        for court in courts:
             log.info("Adding {}.".format(court))
 
             # suppress most logging in this next part
@@ -647,67 +3284,95 @@ if __name__ == '__main__':
             try:
                 # we're not really trying to scrape, we're just getting
                 # when it was last updated (which scrape() returns)
-                last_updated[court] = scrape(court, lambda x: False,
-                                             dtnow(), lambda x: None)
+                feed = probes[court].result()
+                self.last_updated[court] = scrape(court, lambda x: False,
+                                                  self.clock(),
+                                                  lambda x: None, feed)
+                self.remember_validators(court, feed)
             except Exception:
                 # in the case of errors, just set last_updated
                 # to... something...
                 #
                 # (last_updated will end up syncing to the court's
                 #  actual update schedule later, so we'll be fine)
-                last_updated[court] = dtnow()
+                self.last_updated[court] = self.clock()
 
             # re-enable logging
             logging.disable(logging.NOTSET)
 
-            next_check[court] = last_updated[court] + SCRAPE_INTERVAL
+            self.next_check.reschedule(court, self.last_updated[court],
+                                       self.clock())
+            self.checkpoint(court)
 
+    def check(self, entry_filter):
+        """Check every court that is due, reporting the entries
+        for which `entry_filter` is true. Returns the courts checked."""
+        next_check = self.next_check
+        last_updated = self.last_updated
 
-        #
-        # Do the actual checking.
-        #
-        now = dtnow()
-
-        courts_to_check = [c for c in next_check if next_check[c] < now]
+        courts_to_check = next_check.due(self.clock())
 
         log.info("Checking {}...".format(", ".join(courts_to_check)))
 
+        feeds = self.fetcher.fetch(courts_to_check, self.validators,
+                                   last_updated)
+
         for court in courts_to_check:
             try:
                 log.debug("Checking {} for entries since {}:".format(
                     court, dtfmt(last_updated[court])))
 
+                # result() re-raises any exception from the fetch,
+                # so it is handled below just like before.
+                feed = feeds[court].result()
+                overflowed = feed.overflowed(last_updated[court])
                 last_updated[court] = scrape(
                     court,
-                    default_filter, # You may want to ****REPLACE THIS****
+                    entry_filter,
                     last_updated[court],
-                    notifier)
-                next_check[court] = last_updated[court] + SCRAPE_INTERVAL
-
-                backoff[court] = 1
+                    self.notifier,
+                    feed,
+                    self.seen,
+                    self.metrics)
+                self.remember_validators(court, feed)
+                if overflowed:
+                    log.warning("{} had more new entries than its feed "
+                                "holds; some may have been missed.".format(
+                                    court))
+                    next_check.overflowed(court, last_updated[court],
+                                          self.clock())
+                else:
+                    next_check.reschedule(court, last_updated[court],
+                                          self.clock())
+
+                recovery = self.breaker.success(court, self.clock())
+                if recovery is not None:
+                    log.warning("{} is back, found within {}.".format(
+                        court, recovery))
             except socket.timeout:
                 # treat timeouts specially because they seem to happen a lot
                 log.warning(
                     "Timed out while getting feed for {}.".format(court))
-
-                next_check[court] += backoff[court]*CHECK_INTERVAL
-                backoff[court] *= 2
+                self.error(court, "timeout")
+                self.back_off(court)
                 continue
             except URLError as e:
                 log.warning("Failed to get feed for {}:".format(court))
                 log.warning(e.__class__.__name__+": "+str(e))
-
-                next_check[court] += backoff[court]*CHECK_INTERVAL
-                backoff[court] *= 2
+                self.error(court, "url")
+                self.back_off(court)
                 continue
             except SAXException as e:
                 # Means we got invalid XML.
                 log.warning(
                     "Invalid XML in feed for {} (not reading):".format(court))
                 log.warning(e.__class__.__name__+": "+str(e))
+                self.error(court, "xml")
             except Exception as e:
                 # traceback is printed automatically by logger
                 log.exception(court)
+                self.error(court, "other")
+                self.back_off(court)
                 continue
 
             # NB: the continue statements in the above except blocks
@@ -716,17 +3381,621 @@ if __name__ == '__main__':
 
             # Don't let next_check[court] be in the past.
             # Without this, certain courts get clobbered.
-            #
-            # (Note: Another way of handling this is to keep incrementing
-            #  by SCRAPE_INTERVAL until next_check > now. Not sure which
-            #  method is better, or even if there's a difference.)
-            now = dtnow()
-            if next_check[court] < now:
-                next_check[court] = now + SCRAPE_INTERVAL
+            # (reschedule() already makes sure of this.)
+            now = self.clock()
+            if next_check[court] <= now:
+                next_check.reschedule(court, last_updated[court], now)
+
+            self.checkpoint(court)
 
             log.debug("{} will be next checked at {}.".format(
                 court, dtfmt(next_check[court])))
 
         log.info("Checks complete.")
+        return courts_to_check
 
-        sleep(CHECK_INTERVAL.total_seconds())
+    def cycle(self, cases, entry_filter):
+        """Add any courts in `cases` (see read_cases) which aren't
+        being watched yet, then check() the courts that are due.
+
+        If sharded, only the courts in `cases` that this instance
+        holds are watched, and any others are dropped."""
+        # This adds *all* RSS-enabled courts to the list of courts
+        # to watch. You should ****REPLACE THIS****
+        #for court in RSS_COURTS:
+        #    if court not in cases:
+        #        cases[court] = set()
+
+        for court in sorted(self.unsaved & self.next_check.keys()):
+            self.checkpoint(court)
+
+        courts = set(cases)
+        if self.shard:
+            try:
+                courts = self.shard.claim(sorted(courts))
+                # pick up where the last holder left off
+                self.restore(courts - self.next_check.keys())
+            except sqlite3.Error:
+                # Without our leases renewed, no court is safely ours.
+                log.exception("Couldn't claim courts; trying again "
+                              "next cycle.")
+                return []
+            for court in sorted(self.next_check.keys() - courts):
+                self.drop(court)
+
+        # Add courts to last_updated and next_check if necessary.
+        self.add_courts(sorted(courts - self.next_check.keys()))
+        return self.check(entry_filter)
+
+    def wait(self):
+        """Sleep until the next court is due, but wake up at least
+        every CHECK_INTERVAL to look for new courts (and, if sharded,
+        often enough to renew our leases)."""
+        wait = self.CHECK_INTERVAL
+        if self.shard:
+            wait = min(wait, self.shard.ttl / 3)
+        if self.next_check.next_due() is not None:
+            wait = min(wait, self.next_check.next_due() - self.clock())
+        self.sleep(max(0, wait.total_seconds()))
+
+    def run_once(self, *watchlists):
+        """Check the courts in `watchlists` (Watchlist objects) which
+        are due, reporting entries which pass any of their filters.
+        Returns the courts checked."""
+        # Load case and court information from database
+        # (only actually re-read when the file has changed)
+        if watchlists:
+            cases = {}
+            for watchlist in watchlists:
+                watchlist.reload()
+                cases.update(watchlist.cases)
+            default_filter = any_filter(*[w.filter for w in watchlists])
+        else:
+            # The default filter uses the provided case list,
+            # unless one wasn't provided, in which case it
+            # uses an empty case list.
+            cases = {}
+            default_filter = list_filter({}, {})
+
+        return self.cycle(cases,
+                          default_filter) # You may want to ****REPLACE THIS****
+
+    def close(self, dispatch=None):
+        """Stop fetching, close the notifier, and if sharded, hand our
+        courts over right away.
+
+        If `dispatch` (a DispatchQueue the notifier passes entries on
+        to) is given, everything reported so far is delivered first.
+        A notifier in front of it may still be holding entries back,
+        as RecapResolver does, so it is flushed and joined before
+        `dispatch` is."""
+        self.fetcher.shutdown()
+        if dispatch:
+            if hasattr(self.notifier, 'flush'):
+                self.notifier.flush()
+            if hasattr(self.notifier, 'join'):
+                self.notifier.join()
+            dispatch.join()
+        if hasattr(self.notifier, 'close'):
+            self.notifier.close()
+        if self.shard:
+            self.shard.leave()
+
+    def run(self, *watchlists):
+        """run_once() forever, waiting in between. A cycle which fails
+        is logged, and the next one goes ahead anyway."""
+        while True:
+            try:
+                self.run_once(*watchlists)
+            except Exception:
+                log.exception("Cycle failed.")
+            self.wait()
+
+
+def feed_files(sources):
+    """Yield (name, path, data) for every file in `sources`: files,
+    directories (searched recursively) and tarballs. `data` is the
+    contents of files in tarballs, and None for the others, which
+    are left to be read by whoever wants them."""
+    import tarfile
+    for source in sources:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    yield path, path, None
+        elif tarfile.is_tarfile(source):
+            # as a stream, so compressed tarballs are only read once
+            with tarfile.open(source, "r|*") as tar:
+                for member in tar:
+                    if member.isfile():
+                        yield ("{}:{}".format(source, member.name), None,
+                               tar.extractfile(member).read())
+        else:
+            yield source, source, None
+
+# The filter of a backfill worker process (see backfill_init)
+backfill_filter = None
+
+def backfill_init(case_list=None, keywords=None):
+    """Set up a backfill worker to report what the scraper would,
+    given the same --case-list and --keywords; everything if neither."""
+    global backfill_filter
+    watchlists = []
+    if keywords:
+        watchlists.append(KeywordWatchlist(keywords))
+    if case_list:
+        watchlists.append(Watchlist(case_list))
+    for watchlist in watchlists:
+        watchlist.reload()
+    backfill_filter = any_filter(*[w.filter for w in watchlists]) \
+        if watchlists else (lambda entry: True)
+
+def backfill_files(files):
+    """Parse and filter `files`, as from feed_files(), in a backfill
+    worker. Returns a list of (name, entries, rows, error): how many
+    entries each file had, SQLiteSink rows of those which passed the
+    filter, and why it couldn't be read, if it couldn't.
+
+    A file which can't be read, or has an entry which can't be (say,
+    an item without a description), is skipped as a whole."""
+    results = []
+    for name, path, data in files:
+        try:
+            if data is None:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            if data[:2] == b"\x1f\x8b":
+                data = gzip.decompress(data)
+            feed = parse_feed(BytesIO(data))
+            rows = []
+            for e in feed.entries:
+                entry = RSSEntry(e)
+                # without a number, there is no sensible LREF to key on
+                if entry.number > 0 and backfill_filter(entry):
+                    rows.append(SQLiteSink.row(entry))
+        except (OSError, EOFError, SAXException) as e:
+            results.append((name, 0, [], str(e) or e.__class__.__name__))
+            continue
+        except (KeyError, ValueError, IndexError, TypeError) as e:
+            results.append((name, 0, [], "{}: {}".format(
+                e.__class__.__name__, e)))
+            continue
+        results.append((name, len(feed.entries), rows, None))
+    return results
+
+def backfill(db, sources, case_list=None, keywords=None, processes=None,
+             batch=20000, chunk=8, progress=None):
+    """Load the entries in saved feeds (see feed_files) which pass the
+    filters of `case_list` and `keywords` into the filings table of
+    `db`, as SQLiteSink would have recorded them.
+
+    Files are parsed and filtered `chunk` at a time by a pool of
+    `processes` worker processes (by default, one per CPU; with one,
+    in this process). Entries are deduplicated on LREF, keeping
+    whichever was loaded first, and written about `batch` at a time,
+    in one transaction each along with the names of the files they
+    came from. Files already loaded are skipped, so an interrupted
+    backfill can be run again to pick up where it left off.
+
+    `progress` is called every few seconds, and at the end, with a
+    dict of counts: files, skipped, errors, entries, rows (which
+    passed the filters), new (rows which weren't loaded before) and
+    seconds.
+    """
+    sink = SQLiteSink(db)
+    conn = sink.conn
+    with conn:
+        conn.execute("""CREATE TABLE IF NOT EXISTS backfilled
+                        (source TEXT PRIMARY KEY, entries INTEGER,
+                         error TEXT)""")
+    done = {row[0] for row in conn.execute("SELECT source FROM backfilled")}
+    stats = OrderedDict((key, 0) for key in ("files", "skipped", "errors",
+                                             "entries", "rows", "new"))
+    start = last_report = monotonic()
+    rows, loaded = [], []
+
+    def flush():
+        with conn:
+            stats['new'] += conn.executemany(
+                """INSERT INTO filings (time, lref, case_name, number,
+                                        title, pacer, court, caption)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (lref) DO NOTHING""", rows).rowcount
+            conn.executemany("""INSERT OR REPLACE INTO backfilled
+                                (source, entries, error) VALUES (?, ?, ?)""",
+                             loaded)
+        del rows[:], loaded[:]
+
+    def collect(results):
+        nonlocal last_report
+        for name, entries, found, error in results:
+            stats['files'] += 1
+            stats['errors'] += error is not None
+            stats['entries'] += entries
+            stats['rows'] += len(found)
+            rows.extend(found)
+            loaded.append((name, entries, error))
+            if error:
+                log.warning("Couldn't read {}: {}".format(name, error))
+        if len(rows) >= batch:
+            flush()
+        if progress and monotonic() - last_report >= 2:
+            last_report = monotonic()
+            progress(dict(stats, seconds=last_report - start))
+
+    def chunks():
+        files = []
+        for name, path, data in feed_files(sources):
+            if name in done:
+                stats['skipped'] += 1
+                continue
+            files.append((name, path, data))
+            if len(files) == chunk:
+                yield files
+                files = []
+        if files:
+            yield files
+
+    processes = processes or os.cpu_count() or 1
+    try:
+        if processes == 1:
+            backfill_init(case_list, keywords)
+            for files in chunks():
+                collect(backfill_files(files))
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(processes, initializer=backfill_init,
+                                     initargs=(case_list, keywords)) as pool:
+                # a few chunks in flight per worker, so that neither
+                # the workers nor the files in memory pile up
+                pending = set()
+                for files in chunks():
+                    pending.add(pool.submit(backfill_files, files))
+                    if len(pending) >= 4 * processes:
+                        finished, pending = wait(pending,
+                                                 return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            collect(future.result())
+                for future in pending:
+                    collect(future.result())
+    finally:
+        # whatever was parsed is kept, along with which files it was
+        flush()
+        sink.close()
+    stats['seconds'] = monotonic() - start
+    if progress:
+        progress(stats)
+    return stats
+
+def backfill_main(argv):
+    """The backfill subcommand: load saved feeds into --db."""
+    parser = argparse.ArgumentParser(
+        prog="pacerrssscraper.py backfill",
+        description="Load the entries in saved rss_outside.pl feeds "
+                    "into the filings table of --db, as if they had "
+                    "been reported. Run it again to resume.")
+    parser.add_argument("sources", nargs='+', metavar="SOURCE",
+                        help="feed file (may be gzipped), directory "
+                             "or tarball")
+    parser.add_argument("--db", action='store', required=True)
+    parser.add_argument("--case-list", action='store',
+                        help="only load entries in these cases")
+    parser.add_argument("--keywords", action='store',
+                        help="only load entries with these keywords "
+                             "(along with those in --case-list)")
+    parser.add_argument("--processes", action='store', type=int,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--batch", action='store', type=int, default=20000,
+                        help="entries to write per transaction")
+    args = parser.parse_args(argv)
+
+    def progress(stats):
+        print("{files} files ({skipped} skipped, {errors} unreadable), "
+              "{entries} entries, {rows} matching, {new} new; "
+              "{rate:.0f} entries/s".format(
+                  rate=stats['entries'] / max(stats['seconds'], 1e-9),
+                  **stats), file=sys.stderr)
+
+    logging.basicConfig(format="%(message)s")
+    backfill(args.db, args.sources, args.case_list, args.keywords,
+             args.processes, args.batch, progress=progress)
+    return 0
+
+def search_main(argv):
+    """The search subcommand: print filings in --db matching a query."""
+    parser = argparse.ArgumentParser(
+        prog="pacerrssscraper.py search",
+        description="Search the filings recorded with --db.")
+    parser.add_argument("query", nargs='?',
+                        help="FTS5 query, e.g. 'Prenda AND title:motion*'")
+    parser.add_argument("--db", action='store', required=True)
+    parser.add_argument("--court", action='append', dest='courts',
+                        help="only this court (may be repeated)")
+    parser.add_argument("--since", action='store',
+                        help="only filings from this date (YYYY-MM-DD)")
+    parser.add_argument("--until", action='store',
+                        help="only filings before this date (YYYY-MM-DD)")
+    parser.add_argument("--limit", action='store', type=int, default=20)
+    parser.add_argument("--json", action='store_true',
+                        help="print one JSON object per filing")
+    args = parser.parse_args(argv)
+
+    def date(s):
+        try:
+            return datetime.strptime(s, "%Y-%m-%d").replace(tzinfo=UTC)
+        except ValueError:
+            parser.error("bad date: {}".format(s))
+    since = args.since and date(args.since)
+    until = args.until and date(args.until)
+
+    try:
+        results = search_filings(args.db, args.query, args.courts,
+                                 since, until, args.limit)
+    except sqlite3.OperationalError as e:
+        parser.error(str(e))
+    for result in results:
+        if args.json:
+            result['time'] = result['time'].isoformat()
+            print(json.dumps(result, sort_keys=True))
+        else:
+            print("{} {:<5} {} {} [{}] {}  {}".format(
+                dtfmt(result['time']), result['court'], result['caption'],
+                result['case_name'], result['number'], result['title'],
+                result['pacer']))
+    return 0
+
+
+if __name__ == '__main__':
+    # Subcommands, which don't run the scraper.
+    if sys.argv[1:2] == ["search"]:
+        sys.exit(search_main(sys.argv[2:]))
+    if sys.argv[1:2] == ["backfill"]:
+        sys.exit(backfill_main(sys.argv[2:]))
+
+    # get command-line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--case-list", action='store')
+    parser.add_argument("--keywords", action='store',
+                        help="JSON list of keywords to look for in "
+                             "titles and case names in every court")
+    parser.add_argument("--log", action='store')
+    parser.add_argument("--verbose", "-v", action='count', default=0)
+    parser.add_argument("--email", action='store_true')
+    parser.add_argument("--twitter", action='store_true')
+    parser.add_argument("--workers", action='store', type=int, default=8,
+                        help="number of feeds to fetch at once")
+    parser.add_argument("--per-host", action='store', type=int, default=1,
+                        help="maximum concurrent requests to any one host")
+    parser.add_argument("--connect-timeout", action='store', type=float,
+                        default=5,
+                        help="seconds to wait for ECF servers to connect")
+    parser.add_argument("--read-timeout", action='store', type=float,
+                        default=10,
+                        help="seconds to wait for ECF servers to send "
+                             "anything")
+    parser.add_argument("--state", action='store',
+                        help="SQLite file in which to keep state "
+                             "across restarts")
+    parser.add_argument("--db", action='store',
+                        help="SQLite file to record reported filings in")
+    parser.add_argument("--once", action='store_true',
+                        help="check the courts which are due, deliver "
+                             "the notifications and exit (e.g. from "
+                             "cron); needs --state")
+    parser.add_argument("--spool", action='store',
+                        help="deliver notifications in the background, "
+                             "spooling them to this SQLite file")
+    parser.add_argument("--e-digest", choices=["recipient", "case"],
+                        help="send one email per recipient or per case "
+                             "for each scrape instead of one per entry")
+    parser.add_argument("--e-server", action='store',
+                        default="smtp.gmail.com:587",
+                        help="SMTP server as host:port")
+    parser.add_argument("--shard", action='store', metavar="NAME",
+                        help="share the courts with other instances "
+                             "using the same --state, as NAME")
+    parser.add_argument("--archive", action='store', metavar="DIR",
+                        help="keep every feed fetched, compressed, in DIR")
+    parser.add_argument("--recap", action='store_true',
+                        help="check which RECAP links of entries exist "
+                             "before reporting them (just once: entries "
+                             "aren't reported again when their document "
+                             "turns up later)")
+    parser.add_argument("--stream", action='store', type=int,
+                        metavar="PORT",
+                        help="stream reported entries as Server-Sent "
+                             "Events on this port, at /events")
+    parser.add_argument("--stream-host", action='store',
+                        default="127.0.0.1", metavar="ADDRESS",
+                        help="address to stream entries on (default: "
+                             "%(default)s; \"\" for every interface)")
+    parser.add_argument("--metrics", action='store', type=int,
+                        metavar="PORT",
+                        help="serve Prometheus metrics on this port")
+    parser.add_argument("--metrics-host", action='store',
+                        default="127.0.0.1", metavar="ADDRESS",
+                        help="address to serve metrics on (default: "
+                             "%(default)s; \"\" for every interface)")
+    parser.add_argument("--min-interval", action='store', type=float,
+                        default=5,
+                        help="minutes to wait at least between checks "
+                             "of any one court")
+    parser.add_argument("--max-interval", action='store', type=float,
+                        default=120,
+                        help="minutes to wait at most between checks "
+                             "of any one court")
+    parser.add_argument("--max-backoff", action='store', type=float,
+                        default=60,
+                        help="minutes to wait at most before checking "
+                             "a court which is down again")
+    for arg in ["--e-from", "--e-pass", "--e-to",
+                "--t-oauth-token", "--t-oauth-secret",
+                "--t-consumer-key", "--t-consumer-secret"]:
+        parser.add_argument(arg, action='store', default="")
+    args = parser.parse_args()
+
+    case_list = args.case_list
+    log_location = args.log
+    verbosity = min(3, args.verbose) # verbosity breaks after -vvv
+
+    # Between runs, when each court is due is only kept in --state.
+    if args.once and not args.state:
+        parser.error("--once needs --state")
+
+    # Instances sharing the courts hand them over through --state.
+    shard = None
+    if args.shard:
+        if not args.state:
+            parser.error("--shard needs --state")
+        shard = Shard(args.state, args.shard)
+
+    notifier = make_notifier(
+        twitter={
+            'oauth_token': args.t_oauth_token,
+            'oauth_secret': args.t_oauth_secret,
+            'consumer_key': args.t_consumer_key,
+            'consumer_secret': args.t_consumer_secret
+        },
+        email={
+            'from': args.e_from,
+            'to': args.e_to,
+            'pass': args.e_pass}
+    )
+
+    # set up the logger (separate from notifier)
+    log.setLevel(logging.DEBUG)
+
+    log_format = logging.Formatter(
+        fmt="[{asctime}] *"+VERSION+"* {levelname}: {message}",
+        datefmt="%a %b %d %X %Y UTC", style="{")
+    # use UTC time instead of local time since
+    # the RSS feeds' times are given in UTC
+    log_format.converter = gmtime
+
+    log_stdout = logging.StreamHandler()
+    log_stdout.setLevel(logging.ERROR - 10*verbosity)
+    log_stdout.setFormatter(log_format)
+    log.addHandler(log_stdout)
+
+    if log_location:
+        # WatchedFileHandler allows for the log file
+        # to be modified or even moved underneath us.
+        log_file = logging.handlers.WatchedFileHandler(log_location)
+        log_file.setLevel(logging.ERROR - 10*verbosity)
+        log_file.setFormatter(log_format)
+        log.addHandler(log_file)
+
+
+    # set up a SIGTERM/SIGINT handler so that this process
+    # can be killed with Ctrl+C or kill(1).
+    #
+    # It runs in the main thread between any two bytecodes, perhaps
+    # while that holds a lock which closing the notifiers would need,
+    # so all it does is raise. The notifiers are closed once that has
+    # unwound the main loop (releasing any locks), in its `finally`.
+    quit_signals = []
+    def cb_quit(signum, frame):
+        """Quit with exit code 0."""
+        quit_signals.append(signum)
+        raise SystemExit(0)
+    signal.signal(signal.SIGTERM, cb_quit)
+    signal.signal(signal.SIGINT, cb_quit)
+
+    # Override sys.excepthook
+    def exception_handler(exc_type, value, tb):
+        log.error(*traceback.format_exception(exc_type, value, tb))
+    sys.excepthook = exception_handler
+
+    # ------------------------------
+
+    log.critical("Starting...")
+    log.critical("We are process {}".format(os.getpid()))
+
+    # Each kind of notifier gets its own lane in the DispatchQueue.
+    notifiers = OrderedDict([("notify", notifier)])
+    if args.db:
+        notifiers["sql"] = SQLiteSink(args.db)
+    if args.twitter:
+        notifiers["twitter"] = TwitterPublisher(
+            args.t_oauth_token, args.t_oauth_secret,
+            args.t_consumer_key, args.t_consumer_secret)
+    if args.stream:
+        notifiers["stream"] = EntryStream()
+        notifiers["stream"].serve(args.stream, args.stream_host)
+    if args.email:
+        host, _, port = args.e_server.rpartition(":")
+        notifiers["email"] = EmailNotifier(
+            args.e_from, args.e_pass, args.e_to.split(","),
+            host, int(port), digest=args.e_digest)
+
+    dispatch = None
+    if args.spool:
+        notifier = dispatch = DispatchQueue(notifiers, args.spool)
+    else:
+        if "twitter" in notifiers:
+            # Waiting out Twitter's rate limit mustn't hold up scraping,
+            # so tweets always go out in the background. Without
+            # --spool, any still queued are lost when we stop.
+            dispatch = DispatchQueue(
+                {"twitter": notifiers.pop("twitter")}, ":memory:",
+                maxsize=0)
+            notifiers["twitter"] = dispatch
+        notifier = combine_notifiers(*notifiers.values())
+
+    if args.recap:
+        notifier = RecapResolver(notifier, background=True,
+                                 connections=ConnectionPool(
+                                     args.connect_timeout,
+                                     args.read_timeout))
+
+    # Each court is checked about as often as its feed is rebuilt,
+    # within these bounds. Setting the lower one too low may make
+    # the PACER people mad.
+    next_check = Scheduler(timedelta(minutes=args.min_interval),
+                           timedelta(minutes=args.max_interval))
+
+    # Pick up where the last run left off.
+    store = StateStore(args.state) if args.state else None
+
+    # Entries already reported, which shouldn't be again.
+    # Without --state this only lasts until the scraper is restarted.
+    seen = SeenStore(args.state or ":memory:")
+
+    metrics = None
+    if args.metrics:
+        metrics = Metrics()
+        metrics.serve(args.metrics, args.metrics_host)
+
+    scraper = Scraper(notifier,
+                      FeedFetcher(args.workers, args.per_host,
+                                  metrics=metrics,
+                                  archive=args.archive and
+                                  FeedArchive(args.archive),
+                                  connections=ConnectionPool(
+                                      args.connect_timeout,
+                                      args.read_timeout)),
+                      next_check, store, seen, metrics, shard,
+                      CircuitBreaker(Scraper.CHECK_INTERVAL,
+                                     timedelta(minutes=args.max_backoff)))
+    watchlists = []
+    if args.keywords:
+        watchlists.append(KeywordWatchlist(args.keywords))
+    if case_list:
+        watchlists.append(Watchlist(case_list))
+
+    try:
+        if args.once:
+            scraper.run_once(*watchlists)
+        else:
+            scraper.run(*watchlists)
+    finally:
+        if quit_signals:
+            log.critical("Received {}. Quitting.\n--------------------\n"
+                         .format(signal.Signals(quit_signals[0]).name))
+        # Unless killed, --once delivers everything before leaving;
+        # otherwise undelivered notifications are left in the spool.
+        scraper.close(dispatch if args.once and not quit_signals else None)
+    log.critical("Checked the courts that were due. Quitting.")
+    sys.exit(0)
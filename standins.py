@@ -0,0 +1,426 @@
+"""
+ Local stand-ins for the services pacerrssscraper talks to,
+ so that ./tests and ./run-benchmarks can run without a network.
+
+ Each stand-in is a server listening on 127.0.0.1 on a free port,
+ served from a background thread as soon as it is created.
+ Call close() to shut it down.
+"""
+import socketserver
+import socket
+import threading
+import json
+import time
+import re
+import gzip
+from functools import lru_cache
+from collections import Counter
+from datetime import timedelta
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# pylint: disable=C0103
+
+
+class StandIn:
+    """Mixin running a socketserver server in a background thread."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def start(self):
+        """Serve in a background thread."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+
+    @property
+    def port(self):
+        """The port we are listening on."""
+        return self.server_address[1]
+
+    def close(self):
+        """Stop serving."""
+        self.shutdown()
+        self.server_close()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough of SMTP for smtplib to send mail."""
+    def reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 localhost stand-in")
+        sender, recipients = None, []
+        for line in self.rfile:
+            command = line.decode("ascii").strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif verb == "MAIL":
+                sender, recipients = command[10:].strip("<>"), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command[8:].strip("<>"))
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for data_line in self.rfile:
+                    if data_line == b".\r\n":
+                        break
+                    data.append(data_line)
+                with self.server.lock:
+                    self.server.messages.append(
+                        (sender, recipients, b"".join(data)))
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else: # RSET, NOOP, ...
+                self.reply("250 OK")
+
+
+class SMTPStandIn(StandIn, socketserver.ThreadingTCPServer):
+    """An SMTP server accepting any mail without authentication.
+
+    - messages:    (from, [to, ...], data) for every message received
+    - connections: the number of sessions opened
+    """
+    def __init__(self):
+        socketserver.ThreadingTCPServer.__init__(self, ("127.0.0.1", 0),
+                                                 SMTPHandler)
+        self.messages = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.start()
+
+
+class TwitterHandler(BaseHTTPRequestHandler):
+    """POST statuses/update, with rate limits and duplicate detection."""
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, code, data):
+        server = self.server
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Rate-Limit-Limit", str(server.limit))
+        self.send_header("X-Rate-Limit-Remaining", str(server.remaining))
+        self.send_header("X-Rate-Limit-Reset", str(int(server.reset)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode("utf-8"))
+        status = form.get("status", [""])[0]
+
+        with server.lock:
+            server.requests += 1
+            if time.time() >= server.reset:
+                server.remaining = server.limit
+                server.reset = time.time() + server.window
+            if not self.path.endswith("/statuses/update.json"):
+                self.send_json(404, {"errors": [{"code": 34}]})
+            elif server.remaining <= 0:
+                self.send_json(429, {"errors": [{"code": 88}]})
+            elif status in server.statuses:
+                self.send_json(403, {"errors": [{"code": 187}]})
+            else:
+                server.remaining -= 1
+                server.statuses.append(status)
+                self.send_json(200, {"id": len(server.statuses),
+                                     "text": status})
+
+
+class TwitterStandIn(StandIn, ThreadingHTTPServer):
+    """The part of the Twitter API used by TwitterPublisher.
+
+    At most `limit` statuses may be posted every `window` seconds.
+    Use "127.0.0.1:<port>" as the domain, without HTTPS.
+
+    - statuses: every status posted
+    - requests: the number of requests made
+    """
+    def __init__(self, limit=300, window=3*60*60):
+        ThreadingHTTPServer.__init__(self, ("127.0.0.1", 0), TwitterHandler)
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.reset = time.time() + window
+        self.statuses = []
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.start()
+
+
+class SimulatedClock:
+    """A clock which only moves when slept on.
+
+    now() and sleep() stand in for pacerrssscraper.dtnow() and
+    time.sleep(), so hours of scraping take no time at all.
+    """
+    def __init__(self, start):
+        self.time = start
+
+    def now(self):
+        return self.time
+
+    def sleep(self, seconds):
+        self.time += timedelta(seconds=seconds)
+
+
+@lru_cache(maxsize=256)
+def compressed(body):
+    """`body` gzipped, as a web server would keep it cached."""
+    return gzip.compress(body, 6)
+
+
+def etag(built):
+    """The ETag of a feed built at `built`."""
+    return '"{:x}"'.format(int(built))
+
+
+class PACERHandler(BaseHTTPRequestHandler):
+    """GET /<court>/cgi-bin/rss_outside.pl, with faults,
+    over keep-alive connections."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        time.sleep(self.server.handshake)
+        # Headers and body are written separately; without this, the
+        # body of the second response on a connection waits on a
+        # delayed ACK, as it wouldn't from a real web server.
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.server.tls:
+            self.request.do_handshake()
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def send_body(self, code, body=b"", built=None):
+        if code == 304 and not self.server.repeat_validators:
+            built = None
+        self.send_response(code)
+        self.send_header("Content-Type", "application/rss+xml")
+        if body and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = compressed(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        with self.server.lock:
+            self.server.sent += len(body)
+        if built is not None:
+            self.send_header("ETag", etag(built))
+            self.send_header("Last-Modified", formatdate(built, usegmt=True))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        court = self.path.split("/")[1]
+        with server.lock:
+            server.requests[court] += 1
+            server.headers[court] = self.headers
+        fault = server.faults.get(court)
+
+        time.sleep(server.latency.get(court, 0))
+        if fault == "timeout":
+            time.sleep(server.hang)
+            self.close_connection = True
+            return
+        if court not in server.recordings:
+            self.send_body(404)
+            return
+        if fault == "error":
+            self.send_body(500)
+            return
+
+        body, built = server.render(court)
+        match = self.headers.get("If-None-Match")
+        since = self.headers.get("If-Modified-Since")
+        if match is not None:
+            unchanged = match == etag(built)
+        else:
+            unchanged = since and \
+                parsedate_to_datetime(since).timestamp() >= built
+        if unchanged:
+            self.send_body(304, built=built)
+        else:
+            self.send_body(200, body, built)
+
+
+class PACERStandIn(StandIn, ThreadingHTTPServer):
+    """ECF servers replaying recorded rss_outside.pl feeds.
+
+    `recordings` maps courts to a recorded feed (bytes). At any time
+    by `clock` (which returns an offset-aware datetime), a court serves
+    its feed as it would have been when it was last rebuilt: rebuilds
+    happen every `rebuild[court]` seconds (10 minutes by default),
+    and include the latest `window` entries published by then. Use
+    `url` as pacerrssscraper's FEED_URL. With `tls` (a server-side
+    SSLContext), feeds are served over HTTPS.
+
+    These may be changed at any time:
+    - latency: court --> seconds to wait before answering
+    - handshake: seconds to wait before answering on a new connection
+    - faults:  court --> "timeout" (wait `hang` seconds, then hang up),
+               "error" (500), "malformed" (truncated XML), or
+               "empty" (a channel without items)
+    - repeat_validators: whether 304s repeat the ETag and Last-Modified
+               (True by default; not every server does)
+
+    - requests: a Counter of requests made for each court
+    - headers: court --> headers of the last request for it
+    - connections: how many connections have been made
+    - sent: how many bytes of feeds have been sent
+
+    Feeds are gzipped for clients which accept that.
+    """
+    request_queue_size = 64
+    p_item = re.compile(r'<item>.*?</item>\n?', re.S)
+    p_date = re.compile(r'<pubDate>(.*?)</pubDate>')
+    p_build = re.compile(r'<lastBuildDate>.*?</lastBuildDate>')
+
+    def __init__(self, recordings, clock=None, rebuild=None, window=None,
+                 tls=None):
+        ThreadingHTTPServer.__init__(self, ("127.0.0.1", 0), PACERHandler)
+        self.tls = tls
+        if tls:
+            # handshakes happen in the handler threads
+            self.socket = tls.wrap_socket(self.socket, server_side=True,
+                                          do_handshake_on_connect=False)
+        # court --> (header, [(published, item), ...])
+        self.recordings = {}
+        for court, feed in recordings.items():
+            text = feed.decode("iso-8859-1")
+            items = self.p_item.findall(text)
+            header = text[:text.index("<item>")] if items else \
+                text[:text.index("</channel>")]
+            self.recordings[court] = (header, [
+                (parsedate_to_datetime(
+                    self.p_date.search(item).group(1)).timestamp(), item)
+                for item in items])
+        self.clock = clock
+        self.rebuild = rebuild or {}
+        self.window = window
+        self.latency = {}
+        self.faults = {}
+        self.hang = 5
+        self.handshake = 0
+        self.repeat_validators = True
+        self.requests = Counter()
+        self.headers = {}
+        self.connections = 0
+        self.sent = 0
+        self.lock = threading.Lock()
+        self.start()
+
+    @property
+    def url(self):
+        return "{}://127.0.0.1:{}/{{}}/cgi-bin/rss_outside.pl".format(
+            "https" if self.tls else "http", self.port)
+
+    def render(self, court):
+        """The current feed of `court`, and when it was built."""
+        now = self.clock().timestamp() if self.clock else time.time()
+        every = self.rebuild.get(court, 600)
+        built = now - now % every
+
+        header, items = self.recordings[court]
+        live = [item for published, item in items if published <= built]
+        if self.faults.get(court) == "empty":
+            live = []
+        header = self.p_build.sub(
+            "<lastBuildDate>{}</lastBuildDate>".format(
+                formatdate(built, usegmt=True)), header)
+        body = (header + "".join(live[:self.window]) +
+                "</channel>\n</rss>\n").encode("iso-8859-1")
+        if self.faults.get(court) == "malformed":
+            body = body[:len(body)//2]
+        return body, built
+
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    """HEAD (or GET) /details/<item> and /download/<item>/<file>,
+    over keep-alive connections. Downloads are redirected to
+    /serve/<item>/<file>, as archive.org redirects them to the
+    server holding the file."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def send_status(self, code, location=None):
+        self.send_response(code)
+        if location:
+            self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_HEAD(self):
+        server = self.server
+        with server.lock:
+            server.requests[self.path] += 1
+        time.sleep(server.latency)
+        if server.down:
+            self.send_status(503)
+            return
+
+        parts = self.path.split("/")[1:]
+        files = server.items.get(parts[1]) if len(parts) > 1 else None
+        if files is None:
+            self.send_status(404)
+        elif parts[0] == "details" and len(parts) == 2:
+            self.send_status(200)
+        elif parts[0] == "download" and len(parts) == 3:
+            self.send_status(302, "/serve/{}/{}".format(*parts[1:]))
+        elif parts[0] == "serve" and len(parts) == 3 and parts[2] in files:
+            self.send_status(200)
+        else:
+            self.send_status(404)
+
+    do_GET = do_HEAD
+
+
+class ArchiveStandIn(StandIn, ThreadingHTTPServer):
+    """The part of archive.org holding RECAP's documents.
+
+    `items` maps items (e.g. "gov.uscourts.ilnd.284511") to the set
+    of files in each; both may be changed at any time, as may:
+    - latency: seconds to wait before answering
+    - down:    if true, everything is answered with a 503
+
+    Use `url` as pacerrssscraper's RECAP_URL.
+
+    - requests: a Counter of requests made for each path
+    - connections: how many connections have been made
+    """
+    request_queue_size = 64
+
+    def __init__(self, items=None):
+        ThreadingHTTPServer.__init__(self, ("127.0.0.1", 0), ArchiveHandler)
+        self.items = items or {}
+        self.latency = 0
+        self.down = False
+        self.requests = Counter()
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.start()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.port)